@@ -0,0 +1,139 @@
+import os
+import time
+import random
+import logging
+import threading
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+AIRTABLE_API_URL = os.getenv("AIRTABLE_API_URL", "https://api.airtable.com/v0")  # point at a stub server for tests
+AIRTABLE_RATE_LIMIT = float(os.getenv("AIRTABLE_RATE_LIMIT", "5"))              # Airtable allows 5 requests/s per base
+AIRTABLE_MAX_RETRIES = int(os.getenv("AIRTABLE_MAX_RETRIES", "6"))
+AIRTABLE_BACKOFF_BASE = float(os.getenv("AIRTABLE_BACKOFF_BASE", "1.0"))
+AIRTABLE_BACKOFF_MAX = float(os.getenv("AIRTABLE_BACKOFF_MAX", "30.0"))          # Airtable asks for 30s after a 429
+AIRTABLE_TIMEOUT = float(os.getenv("AIRTABLE_TIMEOUT", "30"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+log = logging.info
+
+
+class AirtableError(RuntimeError):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        # After a 429 nobody in this process should hit the base until the penalty has passed
+        with self._lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def _bucket_for(base_id, rate):
+    with _buckets_lock:
+        if base_id not in _buckets:
+            _buckets[base_id] = TokenBucket(rate)
+        return _buckets[base_id]
+
+
+class AirtableClient:
+    """Pooled, rate-limited Airtable REST client shared by the fetch scripts.
+
+    All clients for the same base share one token bucket. 429 and 5xx responses
+    and connection errors are retried with jittered exponential backoff, honouring
+    Retry-After; anything else that is not a 200 raises AirtableError.
+    """
+
+    def __init__(self, api_token, base_id, api_url=AIRTABLE_API_URL, rate=AIRTABLE_RATE_LIMIT, max_retries=AIRTABLE_MAX_RETRIES):
+        self.base_id = base_id
+        self.api_url = api_url.rstrip("/")
+        self.max_retries = max_retries
+        self.bucket = _bucket_for(base_id, rate)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Authorization"] = f"Bearer {api_token}"
+
+    def _url(self, table, record_id=None):
+        url = f"{self.api_url}/{self.base_id}/{quote(table)}"
+        return f"{url}/{record_id}" if record_id else url
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(AIRTABLE_BACKOFF_MAX, float(retry_after))
+            except ValueError:
+                pass
+        delay = min(AIRTABLE_BACKOFF_MAX, AIRTABLE_BACKOFF_BASE * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def request(self, method, url, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                res = self.session.request(method, url, timeout=AIRTABLE_TIMEOUT, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise AirtableError(f"{method} {url} failed: {e}") from e
+                delay = self._backoff(attempt)
+                log(f"⚠️ Airtable connection error ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if res.status_code == 200:
+                return res.json()
+            if res.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                raise AirtableError(f"{method} {url} returned {res.status_code}: {res.text}", res.status_code)
+            delay = self._backoff(attempt, res.headers.get("Retry-After"))
+            log(f"⚠️ Airtable returned {res.status_code}, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+            if res.status_code == 429:
+                self.bucket.penalize(delay)  # the next acquire() waits it out, for every thread on this base
+            else:
+                time.sleep(delay)
+
+    def iter_pages(self, table, offset=None, **params):
+        """Yield (records, next_offset) per page; pass a saved offset to resume a listing."""
+        while True:
+            page_params = dict(params, offset=offset) if offset else params
+            data = self.request("GET", self._url(table), params=page_params)
+            offset = data.get("offset")
+            yield data.get("records", []), offset
+            if not offset:
+                return
+
+    def list_records(self, table, **params):
+        """All records of a table, following pagination offsets."""
+        records = []
+        for page, _ in self.iter_pages(table, **params):
+            records.extend(page)
+        return records
+
+    def get_record(self, table, record_id):
+        return self.request("GET", self._url(table, record_id))
@@ -0,0 +1,168 @@
+import os
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # faiss-cpu is optional; brute force is used without it
+    faiss = None
+
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "brute")               # "brute" | "faiss"
+ANN_KIND = os.getenv("ANN_KIND", "ivf")                          # index for large partitions: "ivf" | "hnsw"
+ANN_FLAT_MAX = int(os.getenv("ANN_FLAT_MAX", "10000"))           # partitions up to this size use an exact flat index
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))                     # IVF lists, 0 = 4 * sqrt(partition size)
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))                  # IVF lists scanned per query (recall vs latency)
+ANN_HNSW_M = int(os.getenv("ANN_HNSW_M", "32"))
+ANN_EF_CONSTRUCTION = int(os.getenv("ANN_EF_CONSTRUCTION", "200"))
+ANN_EF_SEARCH = int(os.getenv("ANN_EF_SEARCH", "128"))           # HNSW candidate list per query (recall vs latency)
+ANN_RETRAIN_GROWTH = float(os.getenv("ANN_RETRAIN_GROWTH", "4")) # retrain IVF once a partition grows this much
+
+log = logging.info
+
+
+def ann_enabled():
+    if SEARCH_ENGINE != "faiss":
+        return False
+    if faiss is None:
+        logging.warning("⚠️ SEARCH_ENGINE=faiss but faiss is not installed, using brute force")
+        return False
+    return True
+
+
+def row_ids(keys, texts):
+    # Stable 63-bit id per (key, text) so a row keeps its id across reloads until it changes
+    return np.array([
+        int.from_bytes(hashlib.blake2b(f"{k}\0{t}".encode("utf-8"), digest_size=8).digest(), "little") >> 1
+        for k, t in zip(keys, texts)
+    ], dtype=np.int64)
+
+
+class _Partition:
+    def __init__(self, vecs, ids):
+        dim = vecs.shape[1]
+        self.size = len(ids)
+        self.trained_size = self.size
+        if self.size <= ANN_FLAT_MAX:
+            self.kind = "flat"
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        elif ANN_KIND == "hnsw":
+            self.kind = "hnsw"
+            hnsw = faiss.IndexHNSWFlat(dim, ANN_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            hnsw.hnsw.efConstruction = ANN_EF_CONSTRUCTION
+            hnsw.hnsw.efSearch = ANN_EF_SEARCH
+            self.index = faiss.IndexIDMap2(hnsw)
+        else:
+            self.kind = "ivf"
+            nlist = ANN_NLIST or int(4 * np.sqrt(self.size))
+            nlist = max(1, min(nlist, self.size))
+            self.quantizer = faiss.IndexFlatIP(dim)
+            ivf = faiss.IndexIVFFlat(self.quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            ivf.train(vecs)
+            ivf.nprobe = min(ANN_NPROBE, nlist)
+            self.index = ivf
+        self.index.add_with_ids(vecs, ids)
+        self.ids = set(ids.tolist())
+
+    def needs_rebuild(self, new_size, removing):
+        if (new_size <= ANN_FLAT_MAX) != (self.kind == "flat"):
+            return True
+        if self.kind == "hnsw" and removing:
+            return True  # HNSW graphs do not support removal
+        return self.kind == "ivf" and new_size > self.trained_size * ANN_RETRAIN_GROWTH
+
+    def update(self, vecs, ids, new_ids, removed):
+        if removed:
+            self.index.remove_ids(np.fromiter(removed, dtype=np.int64, count=len(removed)))
+        added = ~np.isin(ids, np.fromiter(self.ids, dtype=np.int64, count=len(self.ids)))
+        if added.any():
+            self.index.add_with_ids(vecs[added], ids[added])
+        self.ids = new_ids
+        self.size = len(ids)
+        return int(added.sum())
+
+
+class IdRows:
+    """FAISS id -> row position in one snapshot; ids the snapshot does not hold map to -1.
+
+    Each snapshot keeps its own, so a request that started on the previous snapshot
+    still gets its own rows while the shared index is already synced to the next one.
+    """
+
+    def __init__(self, ids):
+        order = np.argsort(ids, kind="stable")
+        self.sorted_ids = ids[order]
+        self.rows = order
+
+    def __call__(self, labels):
+        if not len(self.sorted_ids):
+            return np.full(labels.shape, -1, dtype=np.int64)
+        pos = np.clip(np.searchsorted(self.sorted_ids, labels), 0, len(self.sorted_ids) - 1)
+        return np.where((labels >= 0) & (self.sorted_ids[pos] == labels), self.rows[pos], -1)
+
+
+class PartitionedAnnIndex:
+    """One FAISS sub-index per partition (website, or SEO/project pair).
+
+    Small partitions get an exact inner-product flat index, large ones IVF or HNSW.
+    sync() patches sub-indexes with add_with_ids/remove_ids where the index type
+    allows it; search() maps FAISS ids back to row positions through the caller's IdRows.
+    """
+
+    def __init__(self):
+        self.partitions = {}
+        self._lock = threading.RLock()
+
+    def sync(self, slices, ids, vecs):
+        """Bring the sub-indexes in line with a snapshot: `slices` maps partition -> row slice.
+
+        Returns the snapshot's IdRows for search().
+        """
+        vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+        with self._lock:
+            added_total = removed_total = rebuilt = 0
+            for name in set(self.partitions) - set(slices):
+                removed_total += self.partitions.pop(name).size
+            for name, rows in slices.items():
+                part_ids, part_vecs = ids[rows], vecs[rows]
+                part = self.partitions.get(name)
+                new_ids = set(part_ids.tolist())
+                removed = part.ids - new_ids if part is not None else set()
+                if part is None or part.needs_rebuild(len(part_ids), bool(removed)):
+                    self.partitions[name] = _Partition(part_vecs, part_ids)
+                    rebuilt += 1
+                    continue
+                added_total += part.update(part_vecs, part_ids, new_ids, removed)
+                removed_total += len(removed)
+
+            log(f"🧭 ANN index synced: {len(self.partitions)} partitions, {rebuilt} rebuilt, +{added_total}/-{removed_total} vectors")
+        return IdRows(ids)
+
+    def search(self, names, queries, k, id_rows):
+        """Top-k rows for each query over the union of partitions `names`.
+
+        Returns (rows, scores), both shaped (n_queries, k); missing hits are row -1.
+        """
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype=np.float32)
+        all_scores, all_rows = [], []
+        with self._lock:
+            for name in names:
+                part = self.partitions.get(name)
+                if part is None or part.size == 0:
+                    continue
+                scores, labels = part.index.search(queries, min(k, part.size))
+                rows = id_rows(labels)
+                all_scores.append(np.where(rows >= 0, scores, -np.inf))
+                all_rows.append(rows)
+
+        if not all_rows:
+            return np.full((len(queries), 0), -1, dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+        scores = np.concatenate(all_scores, axis=1)
+        rows = np.concatenate(all_rows, axis=1)
+        if scores.shape[1] > k:
+            best = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+            scores = np.take_along_axis(scores, best, axis=1)
+            rows = np.take_along_axis(rows, best, axis=1)
+        return rows, scores
@@ -1,12 +1,23 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
+from markupsafe import Markup
 import pandas as pd
-from sentence_transformers import SentenceTransformer, util
 import numpy as np
 import re, string
+import json
 import logging
 import os
 import time
-from fetch_airtable_client import append_to_csv
+from typing import NamedTuple
+from fetch_airtable_client import append_to_dataset, dataset_store
+from encoders import BatchingEncoder, load_encoder, model_key
+from embedding_store import EmbeddingStore, QueryEmbeddingCache, reuse_vectors
+from vector_search import EMBEDDING_DTYPE, EMBEDDING_RERANK, CompactVectors, compact_vectors, partition_slices, rerank, score_rows, top_k
+from ann_index import SEARCH_ENGINE, IdRows, PartitionedAnnIndex, ann_enabled, row_ids
+from result_cache import ResultCache, search_etag
+from snapshot import SnapshotWatcher, Warmup
+from knn_graph import KNN_GRAPH, KNN_GRAPH_MAX_SEO_ROWS, build_graph, graph_from_arrays
+from webhook_queue import WebhookQueue
+from metrics import Registry, StageTimer, sampled
 
 app = Flask(__name__)
 
@@ -22,10 +33,11 @@ logging.basicConfig(
 
 log = logging.info  # ✅ THIS LINE IS REQUIRED
 
-MODEL_NAME  = "all-mpnet-base-v2"
+MODEL_NAME  = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")  # backend: ENCODER_BACKEND, see encoders.py
 MAX_OUTPUT = 10
 SOFT_THRES  = 0.1
-DATASET_PATH = "dataset_client.csv" # change path here
+SEARCH_QUERY_BLOCK = 64  # queries scored per matrix product in batch searches
+WARMUP_EXACT_ANSWERS = os.getenv("WARMUP_EXACT_ANSWERS", "1") != "0"  # while warming up, answer found keywords without model output
 
 def clean(text: str) -> str:
     if not isinstance(text, str):
@@ -36,7 +48,7 @@ def clean(text: str) -> str:
     return text.strip().lower()
 
 def load_dataset():
-    df = pd.read_csv(DATASET_PATH).dropna(subset=["Keyword Name", "SEO Name", "Project Name", "Keyword"])
+    df = dataset_store.read().dropna(subset=["Keyword Name", "SEO Name", "Project Name", "Keyword"])
     
     if "Content Type" in df.columns:
         df = df[df["Content Type"] == "On Page"]
@@ -46,56 +58,314 @@ def load_dataset():
     df["url"] = df["url"].astype(str)
     df["SEO Name"] = df["SEO Name"].astype(str)
     df["Project Name"] = df["Project Name"].astype(str)
-    df["Month"] = df["Month"].astype(str) if "Month" in df.columns else ""
-    df["Internal Link / External Link"] = df["Internal Link / External Link"].astype(str) if "Internal Link / External Link" in df.columns else ""
-    
+    df["Month"] = df["Month"].fillna("").astype(str) if "Month" in df.columns else ""
+    df["Internal Link / External Link"] = df["Internal Link / External Link"].fillna("").astype(str) if "Internal Link / External Link" in df.columns else ""
+
+    # Sorting by SEO then project makes every SEO and every (SEO, project) pair a contiguous block of rows
+    df = df.sort_values(["SEO Name", "Project Name"], kind="stable").reset_index(drop=True)
     return df
 
-df = load_dataset()
-embedder = SentenceTransformer(MODEL_NAME)
-keywords = df["Keyword Name"].tolist()
-keyword_vecs = embedder.encode(keywords, normalize_embeddings=True)
-
-last_mtime = os.path.getmtime(DATASET_PATH)
-
-def reload_if_needed():
-    global df, keywords, keyword_vecs, last_mtime
-    current_mtime = os.path.getmtime(DATASET_PATH)
-    if current_mtime > last_mtime:
-        df = load_dataset()
-        keywords = df["Keyword Name"].tolist()
-        keyword_vecs = embedder.encode(keywords, normalize_embeddings=True)
-        last_mtime = current_mtime
-        logging.info("🔄 Dataset reloaded due to file update")
-
-def get_projects_by_seo():
-    reload_if_needed()
+def build_partitions(df):
+    # (SEO, project) -> row slice; (SEO, "") covers all of that SEO's projects
+    partitions = partition_slices(df, ["SEO Name", "Project Name"])
+    partitions.update({(seo, ""): rows for seo, rows in partition_slices(df, "SEO Name").items()})
+    return partitions
+
+def build_keyword_index(df):
+    # (SEO, project, cleaned keyword) -> (first row, number of rows); project "" covers the whole SEO
+    keyword_index = {}
+    for cols in (["SEO Name", "Keyword Name"], ["SEO Name", "Project Name", "Keyword Name"]):
+        for key, positions in df.groupby(cols, sort=False).indices.items():
+            if len(key) == 2:
+                key = (key[0], "", key[1])
+            keyword_index[key] = (int(positions[0]), len(positions))
+    return keyword_index
+
+def build_projects_index(partitions):
+    # SEO -> sorted projects from the partition keys, plus the JSON the home page embeds
     projects_map = {}
-    try:
-        for seo_name in df["SEO Name"].unique():
-            projects = df[df["SEO Name"] == seo_name]["Project Name"].unique().tolist()
-            projects_map[seo_name] = sorted(projects)
-    except Exception as e:
-        logging.error(f"Error creating projects map: {e}")
-        projects_map = {}
-    return projects_map
+    for seo, project in partitions:
+        if project:
+            projects_map.setdefault(seo, []).append(project)
+    projects_map = {seo: sorted(projects) for seo, projects in sorted(projects_map.items())}
+    projects_json = json.dumps(projects_map, ensure_ascii=False)
+    for char, escaped in (("<", "\\u003c"), (">", "\\u003e"), ("&", "\\u0026"), ("'", "\\u0027")):
+        projects_json = projects_json.replace(char, escaped)  # safe inside <script>, like Jinja's tojson
+    return projects_map, Markup(projects_json)
+
+class Snapshot(NamedTuple):
+    # Everything a search reads; built in full off the request path, then swapped in whole and never mutated
+    version: int
+    df: pd.DataFrame
+    keywords: list
+    keyword_vecs: object  # float32 array or CompactVectors; None while warming up
+    keyword_names: np.ndarray
+    keyword_urls: np.ndarray
+    partitions: dict
+    keyword_index: dict
+    projects_map: dict
+    projects_json: Markup
+    id_rows: IdRows  # FAISS id -> row, when the FAISS engine is on
+    graph: object  # KnnGraph of precomputed answers, when KNN_GRAPH is on; attached after the vectors, see with_graph()
+
+embedder = None       # in-process model, or a client of the shared EMBEDDING_SERVER; loaded by the warm-up
+query_encoder = None  # concurrent search requests share forward passes
+embedding_store = EmbeddingStore(model_key(MODEL_NAME))  # vectors are cached per backend
+query_cache = QueryEmbeddingCache(model_key(MODEL_NAME))
+result_cache = ResultCache()  # per (dataset version, SEO, project, cleaned keyword)
+ann_index = PartitionedAnnIndex() if ann_enabled() else None
+# Everything besides the dataset version and the request that shapes a result; part of every ETag
+RESULT_TAG = ("client", model_key(MODEL_NAME), EMBEDDING_DTYPE, EMBEDDING_RERANK, SEARCH_ENGINE, KNN_GRAPH, MAX_OUTPUT, SOFT_THRES)
+
+def build_snapshot(df, vecs, version, published_graph=None):
+    # Without a kNN graph unless `published_graph`, (index, arrays) of this version's graph from serve.py, is given
+    keywords = df["Keyword Name"].tolist()
+    keyword_names = df["Keyword Name"].to_numpy()
+    partitions = build_partitions(df)
+    keyword_index = build_keyword_index(df)
+    projects_map, projects_json = build_projects_index(partitions)
+    id_rows = None
+    if ann_index is not None and vecs is not None:
+        # Sub-indexes exist per (SEO, project) pair; SEO-wide searches merge that SEO's pairs
+        pair_slices = {key: rows for key, rows in partitions.items() if key[1]}
+        id_rows = ann_index.sync(pair_slices, row_ids(keywords, keywords), vecs)
+    graph = graph_from_arrays(*published_graph, keyword_names, partitions) if published_graph is not None else None
+    return Snapshot(
+        version, df, keywords, vecs, keyword_names, df["url"].to_numpy(),
+        partitions, keyword_index, projects_map, projects_json, id_rows, graph,
+    )
+
+def with_graph(snap, previous_graph=None):
+    # The same snapshot with its kNN graph; `previous_graph` (the replaced snapshot's) is patched instead of rebuilt
+    started = time.monotonic()
+    graph = build_knn_graph(snap.keyword_vecs, snap.keywords, snap.keyword_names, snap.partitions, snap.keyword_index, previous_graph)
+    graph_seconds.observe(time.monotonic() - started)
+    return snap._replace(graph=graph)
+
+def build_knn_graph(vecs, keywords, keyword_names, partitions, keyword_index, previous):
+    # A search must start from a keyword of its partition, so every answer can be computed ahead:
+    # the same exact scoring and selection as a live search, with the keyword vectors as queries
+    def neighbours(key, rows, local):
+        query_rows = local + rows.start
+        k = MAX_OUTPUT + max(keyword_index[(*key, keyword_names[i])][1] for i in query_rows)
+        cand_rows, sims = exact_scores(vecs, keywords, rows, keyword_query_vectors(vecs, keywords, query_rows), k)
+        answers = []
+        for j, i in enumerate(query_rows):
+            out_rows, out_scores = select_outputs(keyword_names, keyword_names[i], cand_rows[j], sims[j])
+            answers.append((out_rows - rows.start, out_scores))
+        return answers
+
+    def pair_scores(key, rows, query_local, cand_local):
+        queries = keyword_query_vectors(vecs, keywords, query_local + rows.start)
+        if EMBEDDING_RERANK and isinstance(vecs, CompactVectors):
+            return queries @ keyword_query_vectors(vecs, keywords, cand_local + rows.start).T  # as re-ranked
+        return queries @ vecs[cand_local + rows.start].T
+
+    # A (SEO, "") partition holds all of that SEO's projects; past KNN_GRAPH_MAX_SEO_ROWS it is scored per search
+    graphed = {key: rows for key, rows in partitions.items() if key[1] or rows.stop - rows.start <= KNN_GRAPH_MAX_SEO_ROWS}
+    return build_graph(graphed, keyword_names, neighbours, pair_scores, MAX_OUTPUT, SOFT_THRES, previous)
+
+# Warm-up, in the background so Flask binds right away: the dataset first (pages and exact
+# answers work), then the model, then the keyword vectors (full searches, /readyz turns 200).
+# The kNN graph comes after that, from the snapshot watcher; searches encode until it is in
+def read_dataset():
+    global snapshot
+    while not dataset_store.exists():
+        time.sleep(1)  # first start: the fetch script is still writing it
+    version = dataset_store.version()  # read first: a write during the load just triggers another refresh
+    snapshot = build_snapshot(load_dataset(), None, version)
+
+def load_model():
+    global embedder, query_encoder
+    embedder = load_encoder(MODEL_NAME)
+    query_encoder = BatchingEncoder(embedder)
+
+def encode_keywords():
+    global snapshot
+    snap = snapshot
+    keyword_vecs = compact_vectors(embedding_store.encode(snap.keywords, embedder))  # EMBEDDING_DTYPE float16/int8 shrinks it
+    snapshot = build_snapshot(snap.df, keyword_vecs, snap.version)
+
+snapshot = None  # until the dataset is read
+warmup = Warmup([("reading dataset", read_dataset), ("loading model", load_model), ("encoding keywords", encode_keywords)])
+snapshot_follower = None  # set by serve.py in pre-fork workers, which map the parent's snapshots instead of encoding
+
+def apply_snapshot(new_df, new_vecs, version, published_graph=None):
+    global snapshot
+    snapshot = build_snapshot(new_df, new_vecs, version, published_graph)  # one reference assignment; readers hold the old one
+
+def refresh_snapshot():
+    # Runs on the watcher thread (serve.py's parent drives it itself); returns True if a new snapshot is live
+    global snapshot
+    if not warmup.ready.is_set():
+        return False  # the warm-up builds the first full snapshot
+    started = time.monotonic()
+    old = snapshot
+    if snapshot_follower is not None:
+        if not snapshot_follower.poll(apply_snapshot):
+            return False
+        reload_seconds.observe(time.monotonic() - started)
+        logging.info(f"🔄 Switched to snapshot version {snapshot.version} ({len(snapshot.df)} rows)")
+        return True
+    current_version = dataset_store.version()
+    if current_version == old.version:
+        if KNN_GRAPH and old.graph is None:
+            snapshot = with_graph(old)  # the first graph, after the warm-up; serve.py publishes it like a reload
+            return True
+        return False
+    new_df = load_dataset()
+    new_keywords = new_df["Keyword Name"].tolist()
+    # Only keywords that were not in the previous snapshot are encoded
+    new_vecs, n_encoded = reuse_vectors(
+        old.keywords, old.keywords, old.keyword_vecs,
+        new_keywords, new_keywords,
+        lambda texts: embedding_store.encode(texts, embedder),
+    )
+    new_snapshot = build_snapshot(new_df, compact_vectors(new_vecs), current_version)
+    snapshot = with_graph(new_snapshot, old.graph) if KNN_GRAPH else new_snapshot
+    reload_seconds.observe(time.monotonic() - started)
+    logging.info(f"🔄 Dataset reloaded due to dataset update ({n_encoded} new of {len(new_df)} rows)")
+    return True
+
+snapshot_watcher = SnapshotWatcher(refresh_snapshot)  # started below, once the metrics it records exist
+webhook_queue = WebhookQueue(append_to_dataset, on_flushed=snapshot_watcher.wake)
+
+# Prometheus metrics on /metrics; the callbacks read the current globals at scrape time
+registry = Registry("linklist", app="client")
+search_stages = registry.histogram("search_stage_seconds", 'Wall time per search stage; stage="total" is the whole request', ["stage"])
+search_requests = registry.counter("search_requests_total", "Search requests by HTTP status", ["status"])
+search_keywords = registry.counter("search_keywords_total", "Searched keywords by whether they exist in the partition", ["found"])
+reload_seconds = registry.histogram("reload_seconds", "Dataset reloads and snapshot switches")
+graph_seconds = registry.histogram("knn_graph_build_seconds", "kNN graph builds, full or patched: the first after the warm-up, then one per reload")
+registry.counter_fn("reload_failures_total", "Background refreshes that failed; the previous snapshot kept serving", lambda: snapshot_watcher.failures)
+registry.gauge_fn("ready", "1 once the model and keyword vectors are loaded", lambda: int(warmup.ready.is_set()))
+registry.gauge_fn("warmup_seconds", "Time spent warming up, so far or in total", lambda: warmup.status()["seconds"])
+registry.gauge_fn("dataset_rows", "Keywords being searched", lambda: len(snapshot.df) if snapshot else 0)
+registry.gauge_fn("dataset_partitions", "(SEO, project) pairs", lambda: sum(1 for key in snapshot.partitions if key[1]) if snapshot else 0)
+registry.gauge_fn("dataset_version", "Dataset version being searched", lambda: snapshot.version if snapshot else 0)
+registry.gauge_fn("keyword_vectors_bytes", "Memory of the keyword matrix",
+                  lambda: snapshot.keyword_vecs.nbytes if snapshot and snapshot.keyword_vecs is not None else 0)
+registry.gauge_fn("knn_graph_partitions", "Partitions answered from the kNN graph",
+                  lambda: len(snapshot.graph.partitions) if snapshot and snapshot.graph else 0)
+registry.gauge_fn("knn_graph_bytes", "Memory of the kNN graph", lambda: snapshot.graph.nbytes if snapshot and snapshot.graph else 0)
+registry.gauge_fn("webhook_queue_pending", "Webhook records waiting to be written", lambda: webhook_queue.stats()["pending"])
+registry.gauge_fn("webhook_queue_lag_seconds", "Age of the oldest waiting webhook record", lambda: webhook_queue.stats()["oldest_pending_seconds"])
+registry.gauge_fn("webhook_last_batch_lag_seconds", "Wait of the oldest record in the last written batch", lambda: webhook_queue.last_batch_lag_seconds)
+registry.counter_fn("webhook_records_total", "Webhook records received", lambda: webhook_queue.received)
+registry.counter_fn("query_cache_hits_total", "Query vectors served from the LRU", lambda: query_cache.hits)
+registry.counter_fn("query_cache_misses_total", "Query vectors that had to be encoded", lambda: query_cache.misses)
+registry.counter_fn("query_cache_evictions_total", "Query vectors dropped from the full LRU", lambda: query_cache.evictions)
+registry.counter_fn("result_cache_hits_total", "Keyword results served from the result cache", lambda: result_cache.hits)
+registry.counter_fn("result_cache_misses_total", "Keyword results that had to be computed", lambda: result_cache.misses)
+registry.gauge_fn("encode_queue_depth", "Query texts waiting for a batched forward pass", lambda: query_encoder.stats()["queue_depth"] if query_encoder else 0)
+registry.counter_fn("encode_batches_total", "Batched query forward passes", lambda: query_encoder.batches if query_encoder else 0)
+registry.counter_fn("encode_batched_texts_total", "Query texts encoded in batches", lambda: query_encoder.batched_texts if query_encoder else 0)
+
+warmup.start()
+snapshot_watcher.start()
+
+def warming_up():
+    # 503 until the data a route needs is loaded; Retry-After lets clients and proxies back off
+    return jsonify({"error": "Warming up, try again shortly", **warmup.status()}), 503, {"Retry-After": "5"}
+
+def not_modified(etag):
+    # The client already holds this exact response (same inputs, settings and dataset version)
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+def keyword_query_vectors(vecs, keywords, rows):
+    # What a search for these rows' keywords scores with, without the model: float32 keyword
+    # vectors, from the embedding cache when the matrix is compact
+    if not isinstance(vecs, CompactVectors):
+        return np.asarray(vecs[rows], dtype=np.float32)
+    exact, found = embedding_store.lookup([keywords[i] for i in rows])
+    if not found.all():
+        exact[~found] = vecs[rows[~found]]
+    return exact
+
+def exact_scores(vecs, keywords, rows, input_vecs, k):
+    # Every row of the partition slice against a block of queries; compact scores of the best k are re-ranked
+    sims = score_rows(input_vecs, vecs, rows)
+    cand_rows = np.broadcast_to(np.arange(rows.start, rows.stop), sims.shape)
+    if EMBEDDING_RERANK and isinstance(vecs, CompactVectors):
+        rerank(input_vecs, cand_rows, sims, max(EMBEDDING_RERANK, k),
+               lambda rows: embedding_store.lookup([keywords[i] for i in rows]))  # float32 vectors from the cache
+    return cand_rows, sims
+
+def score_candidates(snap, seo_name, project_name, rows, input_vecs, k):
+    # Candidate rows and cosine similarities for a block of queries, both (n_queries, n_candidates):
+    # exact over the partition slice, or FAISS neighbours (row -1 / -inf pads missing hits)
+    if ann_index is not None:
+        names = [(seo_name, project_name)] if project_name else [key for key in snap.partitions if key[0] == seo_name and key[1]]
+        return ann_index.search(names, input_vecs, k, snap.id_rows)  # FAISS keeps float32 vectors, no re-rank needed
+    return exact_scores(snap.keyword_vecs, snap.keywords, rows, input_vecs, k)
+
+def select_outputs(keyword_names, cleaned_input, cand_rows, sims):
+    # The best MAX_OUTPUT candidates above SOFT_THRES, as (rows, scores); never the input keyword itself
+    sims[keyword_names[cand_rows] == cleaned_input] = -np.inf
+    best = top_k(sims, MAX_OUTPUT, min_score=SOFT_THRES)
+    return cand_rows[best], sims[best]
+
+def extract_links(link_str):
+    if not isinstance(link_str, str):
+        return []
+    pattern = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
+    return [{"title": m.group(1), "url": m.group(2)} for m in pattern.finditer(link_str)]
+
+def build_result(snap, input_row, model_output):
+    input_data = snap.df.iloc[input_row]
+    keyword_names, keyword_urls = snap.keyword_names, snap.keyword_urls
+    month = input_data.get("Month", "")
+    keyword_display_text = input_data["Keyword"]  # ✅ Use display version
+    internal_external = input_data.get("Internal Link / External Link", "")
+    url = input_data["url"]
+
+    links = extract_links(internal_external)
+
+    model_output_links = [
+        {"text": keyword_names[i], "url": keyword_urls[i]}  # ✅ Show readable keyword
+        for i in model_output
+    ]
+
+    return {
+        "month": month,
+        "keyword": {
+            "name": keyword_display_text,
+            "url": url
+        },
+        "links": links if links else [],
+        "model_output": model_output_links if model_output_links else [],
+        "raw_internal_link_text": internal_external if internal_external.strip() else ""
+    }
+
+home_page = (None, None)  # (snapshot version, html), replaced as one tuple
 
 @app.route("/linked-list-matcher", methods=["GET", "POST"]) # change path here
 def home():
+    global home_page
     try:
-        reload_if_needed()
-        seo_names = sorted(df["SEO Name"].unique()) if len(df) > 0 else []
-        projects_map = get_projects_by_seo()
-        initial_projects = projects_map.get(seo_names[0], []) if seo_names else []
-        return render_template("index_client.html", 
-                             seoNames=seo_names,
-                             projects_map=projects_map,
-                             initialProjects=initial_projects)
+        snap = snapshot
+        if snap is None:
+            return warming_up()
+        # Rendered once per dataset version; page loads do not touch the DataFrame
+        version, html = home_page
+        if version != snap.version:
+            seo_names = list(snap.projects_map)
+            initial_projects = snap.projects_map.get(seo_names[0], []) if seo_names else []
+            html = render_template("index_client.html", 
+                                 seoNames=seo_names,
+                                 projects_map=snap.projects_map,
+                                 projects_json=snap.projects_json,
+                                 initialProjects=initial_projects)
+            home_page = (snap.version, html)
+        return html
     except Exception as e:
         logging.error(f"Error in home route: {e}")
         return render_template("index_client.html", 
                              seoNames=[],
                              projects_map={},
+                             projects_json=Markup("{}"),
                              initialProjects=[])
 
 @app.route("/linked-list-matcher/webhook", methods=["POST"]) # change path here
@@ -110,9 +380,9 @@ def webhook():
         flat_record = {"id": record["id"], **record.get("fields", {})}
         log(f"📩 Webhook received. Record ID: {record['id']}")
 
-        os.environ["CSV_PATH"] = "dataset.csv"
-        append_to_csv([flat_record])
-        return jsonify({"status": "success", "updated": record["id"]}), 200
+        # Queue for the batched appender; the worker reloads once per batch
+        pending = webhook_queue.put(flat_record)
+        return jsonify({"status": "queued", "updated": record["id"], "pending": pending}), 202
 
     except Exception as e:
         import traceback
@@ -126,9 +396,10 @@ def get_projects():
         data = request.get_json()
         seo_name = data.get("seoName", "")
 
-        reload_if_needed()
-        projects = df[df["SEO Name"] == seo_name]["Project Name"].dropna().unique().tolist()
-        projects = sorted(projects)
+        snap = snapshot
+        if snap is None:
+            return warming_up()
+        projects = snap.projects_map.get(seo_name, [])
 
         return jsonify({"projects": projects})
     except Exception as e:
@@ -137,90 +408,133 @@ def get_projects():
     
 @app.route("/linked-list-matcher/search", methods=["POST"]) # change path here
 def search():
+    timer = StageTimer(search_stages, sampled())
+    detail = timer.sampled  # per-keyword lines only for sampled requests (or at DEBUG level)
+    status = 200
     try:
-        reload_if_needed()
-        data = request.json
-        input_kw = data.get("keywords", [""])[0]
-        selected_seo_name = data.get("seoName", "").strip()
-        selected_project_name = data.get("projectName", "").strip()
-        cleaned_input = clean(input_kw)
-
-        log(f"🔍 Search input: '{input_kw}' -> cleaned: '{cleaned_input}'")
-        log(f"📊 SEO Name: '{selected_seo_name}', Project: '{selected_project_name}'")
-
-        filtered_df = df[df["SEO Name"] == selected_seo_name]
-        filtered_df['Keyword Name'] = filtered_df['Keyword Name'].astype(str).apply(clean)
-        if selected_project_name:
-            filtered_df = filtered_df[filtered_df["Project Name"] == selected_project_name]
-
-        log(f"📋 Filtered dataset size: {len(filtered_df)}")
-        
-        # Debug: Check if the keyword exists in filtered dataset
-        filtered_df["Keyword Name"] = filtered_df["Keyword Name"].astype(str).apply(clean)
-        matching_keywords = filtered_df[filtered_df["Keyword Name"] == cleaned_input]
-        log(f"🎯 Found {len(matching_keywords)} matching keywords for '{cleaned_input}'")
-        
-        if matching_keywords.empty:
-            # Additional debug info
-            all_keywords_in_filter = filtered_df["Keyword Name"].tolist()
-            log(f"❌ Exact match not found. Sample keywords in dataset: {all_keywords_in_filter[:10]}")
-            log(f"🔍 ALL keywords for SEO '{selected_seo_name}' and Project '{selected_project_name}': {all_keywords_in_filter}")
-            
-            # Check for partial matches (for debugging)
-            partial_matches = [kw for kw in all_keywords_in_filter if cleaned_input in kw or kw in cleaned_input]
-            log(f"🔄 Partial matches found for '{cleaned_input}': {len(partial_matches)}")
-            
-            return jsonify({"error": "Keyword not found"}), 404
-
-        input_data = matching_keywords.iloc[0]
-        month = input_data.get("Month", "")
-        keyword_display_text = input_data["Keyword"]  # ✅ Use display version
-        internal_external = input_data.get("Internal Link / External Link", "")
-        url = input_data["url"]
-
-        def extract_links(link_str):
-            if not isinstance(link_str, str):
-                return []
-            pattern = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
-            return [{"title": m.group(1), "url": m.group(2)} for m in pattern.finditer(link_str)]
-
-        links = extract_links(internal_external)
-
-        kw_list = filtered_df["Keyword Name"].tolist()
-        kw_vecs = embedder.encode(kw_list, normalize_embeddings=True)
-        input_vec = embedder.encode(cleaned_input, normalize_embeddings=True)
-        sims = [(kw, float(util.cos_sim(input_vec, vec))) for kw, vec in zip(kw_list, kw_vecs)]
-        sims.sort(key=lambda x: x[1], reverse=True)
-        model_output = [kw for kw, sim in sims if kw != cleaned_input and sim >= SOFT_THRES][:MAX_OUTPUT]
-
-        model_output_links = []
-        for kw in model_output:
-            row = filtered_df[filtered_df["Keyword Name"] == kw]
-            if not row.empty:
-                model_output_links.append({
-                    "text": kw,  # ✅ Show readable keyword
-                    "url": row.iloc[0]["url"]
-                })
-            else:
-                model_output_links.append({
-                    "text": kw,
-                    "url": "#"
-                })
-
-        return jsonify({
-            "month": month,
-            "keyword": {
-                "name": keyword_display_text,
-                "url": url
-            },
-            "links": links if links else [],
-            "model_output": model_output_links if model_output_links else [],
-            "raw_internal_link_text": internal_external if internal_external.strip() else ""
-        }), 200
+        snap = snapshot  # one snapshot for the whole request, even if the watcher swaps in a new one meanwhile
+        if snap is None:
+            status = 503
+            return warming_up()
+        with timer.stage("filter"):
+            data = request.json
+            input_kws = data.get("keywords") or [""]
+            selected_seo_name = data.get("seoName", "").strip()
+            selected_project_name = data.get("projectName", "").strip()
+
+            # A result depends only on these inputs and the dataset version, so a matching ETag needs no work at all
+            etag = search_etag(RESULT_TAG, snap.version, selected_seo_name, selected_project_name, input_kws)
+            if request.if_none_match.contains_weak(etag):
+                status = 304
+                return not_modified(etag)
+            exact_only = snap.keyword_vecs is None  # warming up: found keywords are answered without model output
+            if exact_only and not WARMUP_EXACT_ANSWERS:
+                status = 503
+                return warming_up()
+            cleaned_inputs = [clean(kw) for kw in input_kws]
+
+            if detail:
+                log(f"🔍 Search input: {input_kws} -> cleaned: {cleaned_inputs}")
+                log(f"📊 SEO Name: '{selected_seo_name}', Project: '{selected_project_name}'")
+
+            rows = snap.partitions.get((selected_seo_name, selected_project_name), slice(0, 0))
+
+            if detail:
+                log(f"📋 Filtered dataset size: {rows.stop - rows.start}")
+
+            # Every input must exist in the partition; the ones that do come from the kNN graph or are encoded in one batch
+            results = [None] * len(input_kws)
+            found = []
+            for i, cleaned_input in enumerate(cleaned_inputs):
+                input_row, n_matches = snap.keyword_index.get((selected_seo_name, selected_project_name, cleaned_input), (None, 0))
+                if detail:
+                    log(f"🎯 Found {n_matches} matching keywords for '{cleaned_input}'")
+
+                if input_row is None:
+                    if detail:
+                        log(f"❌ Exact match not found. Sample keywords in dataset: {snap.keyword_names[rows][:10].tolist()}")
+                    continue
+                found.append((i, input_row, n_matches))
+            search_keywords.inc(len(found), found="yes")
+            search_keywords.inc(len(input_kws) - len(found), found="no")
+
+        if found and exact_only:
+            with timer.stage("links"):
+                for i, input_row, _ in found:
+                    results[i] = {**build_result(snap, input_row, np.empty(0, dtype=np.int64)),
+                                  "warming_up": True}
+        elif found:
+            # Keywords already searched at this dataset version come from the result cache
+            misses = []
+            for i, input_row, n_matches in found:
+                results[i] = result_cache.get((snap.version, selected_seo_name, selected_project_name, cleaned_inputs[i]))
+                if results[i] is None:
+                    misses.append((i, input_row, n_matches))
+            if misses and snap.graph is not None:
+                # Precomputed answers: a lookup per keyword, no model call; partitions too large for the graph are scored below
+                with timer.stage("graph"):
+                    scored = []
+                    for i, input_row, n_matches in misses:
+                        answer = snap.graph.lookup((selected_seo_name, selected_project_name), rows, input_row)
+                        if answer is None:
+                            scored.append((i, input_row, n_matches))
+                            continue
+                        results[i] = build_result(snap, input_row, answer[0])
+                        result_cache.put((snap.version, selected_seo_name, selected_project_name, cleaned_inputs[i]), results[i])
+                    misses = scored
+            if misses:
+                with timer.stage("encode"):
+                    input_vecs = query_cache.encode([cleaned_inputs[i] for i, _, _ in misses], query_encoder)
+            for start in range(0, len(misses), SEARCH_QUERY_BLOCK):
+                block = misses[start:start + SEARCH_QUERY_BLOCK]
+                k = MAX_OUTPUT + max(n_matches for _, _, n_matches in block)
+                with timer.stage("similarity"):
+                    cand_rows, sims = score_candidates(snap, selected_seo_name, selected_project_name, rows,
+                                                       input_vecs[start:start + SEARCH_QUERY_BLOCK], k)
+                with timer.stage("links"):
+                    for j, (i, input_row, _) in enumerate(block):
+                        model_output, _ = select_outputs(snap.keyword_names, cleaned_inputs[i], cand_rows[j], sims[j])
+                        results[i] = build_result(snap, input_row, model_output)
+                        result_cache.put((snap.version, selected_seo_name, selected_project_name, cleaned_inputs[i]), results[i])
+
+        # A single keyword keeps the original response; a batch returns one entry per keyword
+        if len(results) == 1:
+            if results[0] is None:
+                status = 404
+                return jsonify({"error": "Keyword not found"}), 404
+            response = jsonify(results[0])
+        else:
+            response = jsonify({"results": [r if r is not None else {"error": "Keyword not found"} for r in results]})
+        if not exact_only:
+            response.set_etag(etag, weak=True)  # warming-up answers change once the vectors are in
+        return response
 
     except Exception as e:
+        status = 500
         logging.error(f"❌ Error in search route: {e}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        search_requests.inc(status=status)
+        timer.finish("Client search")
+
+@app.route("/healthz")
+@app.route("/linked-list-matcher/healthz") # change path here
+def healthz():
+    # Liveness only: a process that is still warming up is healthy
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz")
+@app.route("/linked-list-matcher/readyz") # change path here
+def readyz():
+    snap = snapshot
+    body = {**warmup.status(), "dataset_version": snap.version if snap else None, "rows": len(snap.df) if snap else 0,
+            "knn_graph": bool(snap and snap.graph is not None)}  # attached after ready
+    return jsonify(body), 200 if warmup.ready.is_set() else 503
+
+@app.route("/metrics")
+@app.route("/linked-list-matcher/metrics") # change path here
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5004)
\ No newline at end of file
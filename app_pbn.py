@@ -1,12 +1,20 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
 import pandas as pd
-from sentence_transformers import SentenceTransformer, util
 import numpy as np
 import re, string
 import logging
 import os
 import time
-from fetch_airtable_pbn import append_to_csv
+from typing import NamedTuple
+from fetch_airtable_pbn import append_to_dataset, dataset_store
+from encoders import BatchingEncoder, load_encoder, model_key
+from embedding_store import EmbeddingStore, QueryEmbeddingCache, reuse_vectors
+from vector_search import EMBEDDING_DTYPE, EMBEDDING_RERANK, CompactVectors, compact_vectors, partition_slices, rerank, score_rows, top_k
+from ann_index import SEARCH_ENGINE, IdRows, PartitionedAnnIndex, ann_enabled, row_ids
+from result_cache import ResultCache, search_etag
+from snapshot import SnapshotWatcher, Warmup
+from webhook_queue import WebhookQueue
+from metrics import Registry, StageTimer, sampled
 
 app = Flask(__name__)
 
@@ -24,11 +32,12 @@ logging.basicConfig(
 log = logging.info  # ✅ THIS LINE IS REQUIRED
 
 
-MODEL_NAME  = "all-mpnet-base-v2"
+MODEL_NAME  = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")  # backend: ENCODER_BACKEND, see encoders.py
 TOP_LIMIT   = 20
 HARD_THRES  = 0.75
 SOFT_THRES  = 0.50
-DATASET_PATH = "dataset_pbn.csv"
+ANN_CANDIDATES = 4 * TOP_LIMIT  # neighbours fetched per query when the FAISS engine is on
+SEARCH_QUERY_BLOCK = 64         # queries scored per matrix product in batch searches
 
 import re
 import string
@@ -46,7 +55,7 @@ def clean(text: str) -> str:
 
 
 def load_dataset():
-    df = pd.read_csv(DATASET_PATH).dropna(subset=["Main Keyword", "🔗 Keyword Link", "Categories", "Website"])
+    df = dataset_store.read().dropna(subset=["Main Keyword", "🔗 Keyword Link", "Categories", "Website"])
     df["Main Keyword"] = df["Main Keyword"].astype(str).apply(clean)
     df["🔗 Keyword Link"] = df["🔗 Keyword Link"].astype(str)
     df["Categories"] = df["Categories"].astype(str).apply(clean)
@@ -54,30 +63,204 @@ def load_dataset():
     
     df["WebsiteName"] = df["Website"]
     df["CategoryName"] = df["Categories"]
-    
+    df["record_id"] = df["record_id"].astype(str) if "record_id" in df.columns else ""
+
+    # Keep each website's rows contiguous so a search scores one slice of keyword_vecs
+    df = df.sort_values("WebsiteName", kind="stable").reset_index(drop=True)
     return df
 
-df = load_dataset()
-embedder = SentenceTransformer(MODEL_NAME)
-keywords = df["Main Keyword"].tolist()
-keyword_vecs = embedder.encode(keywords, normalize_embeddings=True)
-
-last_mtime = os.path.getmtime(DATASET_PATH)
-def reload_if_needed():
-    global df, keywords, keyword_vecs, last_mtime
-    current_mtime = os.path.getmtime(DATASET_PATH)
-    if current_mtime > last_mtime:
-        df = load_dataset()
-        keywords = df["Main Keyword"].tolist()
-        keyword_vecs = embedder.encode(keywords, normalize_embeddings=True)
-        last_mtime = current_mtime
-        logging.info("🔄 Dataset reloaded due to file update")
+class Snapshot(NamedTuple):
+    # Everything a search reads; built in full off the request path, then swapped in whole and never mutated
+    version: int
+    df: pd.DataFrame
+    keywords: list
+    keyword_vecs: object  # float32 array or CompactVectors; None while warming up
+    keyword_links: np.ndarray
+    keyword_categories: np.ndarray
+    website_slices: dict
+    websites: list
+    id_rows: IdRows  # FAISS id -> row, when the FAISS engine is on
+
+embedder = None       # in-process model, or a client of the shared EMBEDDING_SERVER; loaded by the warm-up
+query_encoder = None  # concurrent search requests share forward passes
+embedding_store = EmbeddingStore(model_key(MODEL_NAME))  # vectors are cached per backend
+query_cache = QueryEmbeddingCache(model_key(MODEL_NAME))
+result_cache = ResultCache()  # per (dataset version, website, cleaned keyword)
+ann_index = PartitionedAnnIndex() if ann_enabled() else None
+# Everything besides the dataset version and the request that shapes a result; part of every ETag
+RESULT_TAG = ("pbn", model_key(MODEL_NAME), EMBEDDING_DTYPE, EMBEDDING_RERANK, SEARCH_ENGINE, TOP_LIMIT, HARD_THRES, SOFT_THRES)
+
+def build_snapshot(df, vecs, version):
+    keywords = df["Main Keyword"].tolist()
+    website_slices = partition_slices(df, "WebsiteName")
+    id_rows = None
+    if ann_index is not None and vecs is not None:
+        id_rows = ann_index.sync(website_slices, row_ids(df["record_id"], keywords), vecs)
+    return Snapshot(
+        version, df, keywords, vecs,
+        df["🔗 Keyword Link"].to_numpy(), df["CategoryName"].to_numpy(),
+        website_slices, sorted(website_slices), id_rows,
+    )
+
+# Warm-up, in the background so Flask binds right away: the dataset first (pages work),
+# then the model, then the keyword vectors (searches work, /readyz turns 200)
+def read_dataset():
+    global snapshot
+    while not dataset_store.exists():
+        time.sleep(1)  # first start: the fetch script is still writing it
+    version = dataset_store.version()  # read first: a write during the load just triggers another refresh
+    snapshot = build_snapshot(load_dataset(), None, version)
+
+def load_model():
+    global embedder, query_encoder
+    embedder = load_encoder(MODEL_NAME)
+    query_encoder = BatchingEncoder(embedder)
+
+def encode_keywords():
+    global snapshot
+    snap = snapshot
+    keyword_vecs = compact_vectors(embedding_store.encode(snap.keywords, embedder))  # EMBEDDING_DTYPE float16/int8 shrinks it
+    snapshot = build_snapshot(snap.df, keyword_vecs, snap.version)
+
+snapshot = None  # until the dataset is read
+warmup = Warmup([("reading dataset", read_dataset), ("loading model", load_model), ("encoding keywords", encode_keywords)])
+snapshot_follower = None  # set by serve.py in pre-fork workers, which map the parent's snapshots instead of encoding
+
+def apply_snapshot(new_df, new_vecs, version):
+    global snapshot
+    snapshot = build_snapshot(new_df, new_vecs, version)  # one reference assignment; readers hold the old one
+
+def refresh_snapshot():
+    # Runs on the watcher thread (serve.py's parent drives it itself); returns True if a new snapshot is live
+    if not warmup.ready.is_set():
+        return False  # the warm-up builds the first full snapshot
+    started = time.monotonic()
+    old = snapshot
+    if snapshot_follower is not None:
+        if not snapshot_follower.poll(apply_snapshot):
+            return False
+        reload_seconds.observe(time.monotonic() - started)
+        logging.info(f"🔄 Switched to snapshot version {snapshot.version} ({len(snapshot.df)} rows)")
+        return True
+    current_version = dataset_store.version()
+    if current_version == old.version:
+        return False
+    new_df = load_dataset()
+    # Only rows whose record_id is new or whose keyword changed are encoded
+    new_vecs, n_encoded = reuse_vectors(
+        old.df["record_id"], old.keywords, old.keyword_vecs,
+        new_df["record_id"], new_df["Main Keyword"].tolist(),
+        lambda texts: embedding_store.encode(texts, embedder),
+    )
+    apply_snapshot(new_df, compact_vectors(new_vecs), current_version)
+    reload_seconds.observe(time.monotonic() - started)
+    logging.info(f"🔄 Dataset reloaded due to dataset update ({n_encoded} new/changed of {len(new_df)} rows)")
+    return True
+
+snapshot_watcher = SnapshotWatcher(refresh_snapshot)  # started below, once the metrics it records exist
+webhook_queue = WebhookQueue(append_to_dataset, on_flushed=snapshot_watcher.wake)
+
+# Prometheus metrics on /metrics; the callbacks read the current globals at scrape time
+registry = Registry("linklist", app="pbn")
+search_stages = registry.histogram("search_stage_seconds", 'Wall time per search stage; stage="total" is the whole request', ["stage"])
+search_requests = registry.counter("search_requests_total", "Search requests by HTTP status", ["status"])
+reload_seconds = registry.histogram("reload_seconds", "Dataset reloads and snapshot switches")
+registry.counter_fn("reload_failures_total", "Background refreshes that failed; the previous snapshot kept serving", lambda: snapshot_watcher.failures)
+registry.gauge_fn("ready", "1 once the model and keyword vectors are loaded", lambda: int(warmup.ready.is_set()))
+registry.gauge_fn("warmup_seconds", "Time spent warming up, so far or in total", lambda: warmup.status()["seconds"])
+registry.gauge_fn("dataset_rows", "Keywords being searched", lambda: len(snapshot.df) if snapshot else 0)
+registry.gauge_fn("dataset_version", "Dataset version being searched", lambda: snapshot.version if snapshot else 0)
+registry.gauge_fn("keyword_vectors_bytes", "Memory of the keyword matrix",
+                  lambda: snapshot.keyword_vecs.nbytes if snapshot and snapshot.keyword_vecs is not None else 0)
+registry.gauge_fn("webhook_queue_pending", "Webhook records waiting to be written", lambda: webhook_queue.stats()["pending"])
+registry.gauge_fn("webhook_queue_lag_seconds", "Age of the oldest waiting webhook record", lambda: webhook_queue.stats()["oldest_pending_seconds"])
+registry.gauge_fn("webhook_last_batch_lag_seconds", "Wait of the oldest record in the last written batch", lambda: webhook_queue.last_batch_lag_seconds)
+registry.counter_fn("webhook_records_total", "Webhook records received", lambda: webhook_queue.received)
+registry.counter_fn("query_cache_hits_total", "Query vectors served from the LRU", lambda: query_cache.hits)
+registry.counter_fn("query_cache_misses_total", "Query vectors that had to be encoded", lambda: query_cache.misses)
+registry.counter_fn("query_cache_evictions_total", "Query vectors dropped from the full LRU", lambda: query_cache.evictions)
+registry.counter_fn("result_cache_hits_total", "Keyword results served from the result cache", lambda: result_cache.hits)
+registry.counter_fn("result_cache_misses_total", "Keyword results that had to be computed", lambda: result_cache.misses)
+registry.gauge_fn("encode_queue_depth", "Query texts waiting for a batched forward pass", lambda: query_encoder.stats()["queue_depth"] if query_encoder else 0)
+registry.counter_fn("encode_batches_total", "Batched query forward passes", lambda: query_encoder.batches if query_encoder else 0)
+registry.counter_fn("encode_batched_texts_total", "Query texts encoded in batches", lambda: query_encoder.batched_texts if query_encoder else 0)
+
+warmup.start()
+snapshot_watcher.start()
+
+def warming_up():
+    # 503 until the keyword vectors are loaded; Retry-After lets clients and proxies back off
+    return jsonify({"error": "Warming up, try again shortly", **warmup.status()}), 503, {"Retry-After": "5"}
+
+def not_modified(etag):
+    # The client already holds this exact response (same inputs, settings and dataset version)
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+def exact_vectors(snap, rows):
+    # float32 vectors of dataset rows from the embedding cache, for re-ranking compact scores
+    return embedding_store.lookup([snap.keywords[i] for i in rows])
+
+def score_candidates(snap, website, rows, input_vecs):
+    # Candidate rows and cosine similarities for a block of queries, both (n_queries, n_candidates):
+    # exact over the website slice, or FAISS neighbours (row -1 / -inf pads missing hits)
+    if ann_index is not None:
+        names = [website] if website else snap.websites
+        return ann_index.search(names, input_vecs, ANN_CANDIDATES, snap.id_rows)  # FAISS keeps float32 vectors, no re-rank needed
+    sims = score_rows(input_vecs, snap.keyword_vecs, rows)
+    cand_rows = np.broadcast_to(np.arange(rows.start, rows.stop), sims.shape)
+    if EMBEDDING_RERANK and isinstance(snap.keyword_vecs, CompactVectors):
+        rerank(input_vecs, cand_rows, sims, EMBEDDING_RERANK, lambda rows: exact_vectors(snap, rows))
+    return cand_rows, sims
+
+def build_result(snap, input_kw, cleaned_input, cand_rows, sims):
+    keywords = snap.keywords
+    # แยก matched vs suggested ตาม threshold แล้วเอา top N ของแต่ละกลุ่ม
+    matched_rows   = cand_rows[top_k(sims, TOP_LIMIT, min_score=HARD_THRES)]
+    suggested_rows = cand_rows[top_k(sims, TOP_LIMIT, min_score=SOFT_THRES, max_score=HARD_THRES)]
+
+    # กรองผลลัพธ์ที่ซ้ำกับ input
+    matched_rows   = [i for i in matched_rows   if keywords[i] != cleaned_input]
+    suggested_rows = [i for i in suggested_rows if keywords[i] != cleaned_input]
+    match_words   = [keywords[i] for i in matched_rows]
+    suggest_words = [keywords[i] for i in suggested_rows]
+
+    # ถ้าไม่มีผลลัพธ์ทั้งคู่ ให้เคลียร์ output
+    if not match_words and not suggest_words:
+        return {
+            "input": input_kw,
+            "category": None,
+            "matched_keywords": [],
+            "matched_links": [],
+            "suggested_keywords": [],
+            "suggested_links": [],
+            "message": "No similar keywords found."
+        }
+
+    # สร้างลิงก์จากแถวของผลลัพธ์
+    match_links   = [snap.keyword_links[i] for i in matched_rows]
+    suggest_links = [snap.keyword_links[i] for i in suggested_rows]
+
+    # หมวดหมู่ใช้ของผลลัพธ์แรก (ถ้ามี)
+    first_row = matched_rows[0] if matched_rows else suggested_rows[0]
+    category = snap.keyword_categories[first_row]
+
+    return {
+        "input": input_kw,
+        "category": category,
+        "matched_keywords": match_words,
+        "matched_links": match_links,
+        "suggested_keywords": suggest_words,
+        "suggested_links": suggest_links
+    }
 
 @app.route("/linklist-pbn", methods=["GET", "POST"])
 def home():
-    reload_if_needed()
-    websites = sorted(df["WebsiteName"].unique())
-    return render_template("index_pbn.html", websites=websites)
+    snap = snapshot
+    if snap is None:
+        return warming_up()
+    return render_template("index_pbn.html", websites=snap.websites)
 
 @app.route("/linklist-pbn/webhook", methods=["POST"])
 def webhook():
@@ -91,12 +274,9 @@ def webhook():
         flat_record = {"id": record["id"], **record.get("fields", {})}
         log(f"📩 Webhook received. Record ID: {record['id']}")
 
-        # Ensure CSV path set
-        os.environ["CSV_PATH"] = "dataset_pbn.csv"
-
-        # ✅ Call deduplication appender
-        append_to_csv([flat_record])
-        return jsonify({"status": "success", "updated": record["id"]}), 200
+        # ✅ Queue for the batched deduplication appender; the worker reloads once per batch
+        pending = webhook_queue.put(flat_record)
+        return jsonify({"status": "queued", "updated": record["id"], "pending": pending}), 202
 
     except Exception as e:
         import traceback
@@ -106,86 +286,90 @@ def webhook():
 
 @app.route("/linklist-pbn/search", methods=["POST"])
 def search():
+    timer = StageTimer(search_stages, sampled())
+    status = 200
     try:
-        # โหลดข้อมูลใหม่ถ้าจำเป็น
-        reload_if_needed()
-
-        # รับค่า input จาก client
-        data = request.get_json()
-        input_kw = data.get("keywords", [""])[0]
-        selected_website = data.get("website", "").strip().lower()
-        cleaned_input = clean(input_kw)
-
-
-        # กรอง DataFrame ตามเว็บไซต์ (ถ้ามี)
-        filtered_df = df[df["WebsiteName"].str.lower() == selected_website] if selected_website else df
-        if filtered_df.empty:
+        # ใช้ snapshot เดียวตลอดทั้ง request (watcher สลับตัวใหม่เข้ามาได้ระหว่างนั้น)
+        snap = snapshot
+        if snap is None:
+            status = 503
+            return warming_up()
+
+        # รับค่า input จาก client (ส่งมาได้หลาย keyword ในครั้งเดียว)
+        with timer.stage("filter"):
+            data = request.get_json()
+            input_kws = data.get("keywords") or [""]
+            selected_website = data.get("website", "").strip().lower()
+
+            # ผลลัพธ์ขึ้นกับ dataset version + input เท่านั้น: ETag ตรงกันตอบ 304 ได้เลยโดยไม่ต้องคำนวณ
+            etag = search_etag(RESULT_TAG, snap.version, selected_website, input_kws)
+            if request.if_none_match.contains_weak(etag):
+                status = 304
+                return not_modified(etag)
+            if snap.keyword_vecs is None:
+                status = 503
+                return warming_up()
+            cleaned_inputs = [clean(kw) for kw in input_kws]
+
+            # เลือกช่วงแถวของเว็บไซต์ (ถ้ามี) ใน keyword_vecs ที่โหลดไว้แล้ว
+            rows = snap.website_slices.get(selected_website, slice(0, 0)) if selected_website else slice(0, len(snap.df))
+        if rows.stop <= rows.start:
+            status = 404
             return jsonify({"error": "No keywords for this website"}), 404
 
-        # เตรียมรายการ Main Keyword และ embedding
-        kw_list = filtered_df["Main Keyword"].tolist()
-        kw_vecs = embedder.encode(kw_list, normalize_embeddings=True)
-        input_vec = embedder.encode(cleaned_input, normalize_embeddings=True)
-
-        # คำนวณ similarity
-        sims = [(kw, float(util.cos_sim(input_vec, vec))) for kw, vec in zip(kw_list, kw_vecs)]
-        sims.sort(key=lambda x: x[1], reverse=True)
-
-        # แยก matched vs suggested ตาม threshold
-        matched = [(kw, sim) for kw, sim in sims if sim >= HARD_THRES]
-        suggested = [(kw, sim) for kw, sim in sims if HARD_THRES > sim >= SOFT_THRES]
-
-        # เอา top N ทั้ง matched + suggested
-        total_items = matched[:TOP_LIMIT]
-        if len(total_items) < TOP_LIMIT:
-            need = TOP_LIMIT - len(total_items)
-            total_items += suggested[:need]
-
-        # สร้าง lookup สำหรับลิงก์และหมวดหมู่
-        html_map   = dict(zip(filtered_df["Main Keyword"], filtered_df["🔗 Keyword Link"]))
-        cat_lookup = dict(zip(filtered_df["Main Keyword"], filtered_df["CategoryName"]))
-
-        # เตรียมผลลัพธ์ลิงก์และคำ
-        match_words = [kw for kw, sim in matched[:TOP_LIMIT]]
-        suggest_words = [kw for kw, sim in suggested[:TOP_LIMIT]]
-
-        # กรองผลลัพธ์ที่ซ้ำกับ input
-        match_words    = [kw for kw in match_words    if kw.lower() != cleaned_input.lower()]
-        suggest_words  = [kw for kw in suggest_words  if kw.lower() != cleaned_input.lower()]
-
-        # ถ้าไม่มีผลลัพธ์ทั้งคู่ ให้เคลียร์ output
-        if not match_words and not suggest_words:
-            return jsonify({
-                "input": input_kw,
-                "category": None,
-                "matched_keywords": [],
-                "matched_links": [],
-                "suggested_keywords": [],
-                "suggested_links": [],
-                "message": "No similar keywords found."
-            })
-
-        # สร้างลิงก์จาก lookup
-        match_links   = [html_map.get(kw, f"<a href='#'>{kw}</a>") for kw in match_words]
-        suggest_links = [html_map.get(kw, f"<a href='#'>{kw}</a>") for kw in suggest_words]
-
-        # หมวดหมู่ใช้ของผลลัพธ์แรก (ถ้ามี)
-        first_kw = match_words[0] if match_words else suggest_words[0]
-        category = cat_lookup.get(first_kw, "ไม่ทราบหมวดหมู่")
-
-        # ตอบกลับ JSON
-        return jsonify({
-            "input": input_kw,
-            "category": category,
-            "matched_keywords": match_words,
-            "matched_links": match_links,
-            "suggested_keywords": suggest_words,
-            "suggested_links": suggest_links
-        })
+        # keyword ที่เคยค้นแล้วใน version นี้เอาจาก result cache, ที่เหลือค่อย encode และคำนวณ
+        results = [None] * len(input_kws)
+        misses = []
+        for i, cleaned_input in enumerate(cleaned_inputs):
+            cached = result_cache.get((snap.version, selected_website, cleaned_input))
+            if cached is not None:
+                results[i] = {**cached, "input": input_kws[i]}
+            else:
+                misses.append(i)
+
+        # encode ทุก input ใน batch เดียว แล้วคำนวณ similarity เป็น matrix product (หรือ FAISS)
+        if misses:
+            with timer.stage("encode"):
+                input_vecs = query_cache.encode([cleaned_inputs[i] for i in misses], query_encoder)
+            for start in range(0, len(misses), SEARCH_QUERY_BLOCK):
+                block = misses[start:start + SEARCH_QUERY_BLOCK]
+                with timer.stage("similarity"):
+                    cand_rows, sims = score_candidates(snap, selected_website, rows, input_vecs[start:start + SEARCH_QUERY_BLOCK])
+                with timer.stage("links"):
+                    for j, i in enumerate(block):
+                        results[i] = build_result(snap, input_kws[i], cleaned_inputs[i], cand_rows[j], sims[j])
+                        result_cache.put((snap.version, selected_website, cleaned_inputs[i]), results[i])
+
+        # ตอบกลับ JSON: keyword เดียวคงรูปแบบเดิม, หลาย keyword ตอบเป็นรายการ
+        response = jsonify(results[0]) if len(results) == 1 else jsonify({"results": results})
+        response.set_etag(etag, weak=True)
+        return response
 
     except Exception as e:
+        status = 500
         logging.exception("❌ Error during prediction")
         return jsonify({"error": str(e)}), 500
+    finally:
+        search_requests.inc(status=status)
+        timer.finish("PBN search")
+
+@app.route("/healthz")
+@app.route("/linklist-pbn/healthz")
+def healthz():
+    # Liveness only: a process that is still warming up is healthy
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz")
+@app.route("/linklist-pbn/readyz")
+def readyz():
+    snap = snapshot
+    body = {**warmup.status(), "dataset_version": snap.version if snap else None, "rows": len(snap.df) if snap else 0}
+    return jsonify(body), 200 if warmup.ready.is_set() else 503
+
+@app.route("/metrics")
+@app.route("/linklist-pbn/metrics")
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,8 @@
+"""Offline benchmarks for app_pbn and app_client.
+
+    python -m benchmarks.run --sizes 1000,10000 --stub-encoder
+
+synthetic builds datasets and Airtable tables, stub_airtable serves those tables,
+load drives the HTTP routes and run ties them together per dataset size;
+stub_serve runs serve.py with hash_encoder's HashEncoder instead of the model.
+"""
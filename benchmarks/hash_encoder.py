@@ -0,0 +1,42 @@
+import hashlib
+
+import numpy as np
+
+
+class HashEncoder:
+    """Model-free stand-in for SentenceTransformer, for benchmarks.stub_serve.
+
+    Every word gets a fixed pseudo-random vector and a text is the sum of its words,
+    so keywords sharing words still score close, but encoding costs microseconds and
+    timings show everything except the model. Not for real matching.
+    """
+
+    def __init__(self, dim=768):
+        self.dim = dim
+        self._words = {}
+
+    def _word(self, word):
+        vec = self._words.get(word)
+        if vec is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vec = self._words[word] = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vec
+
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        vecs = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.split():
+                vecs[i] += self._word(word)
+        if normalize_embeddings:
+            norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+            vecs /= np.where(norms > 0, norms, 1)
+        return vecs[0] if single else vecs
+
+
+def install():
+    """Make encoders.load_model() return a HashEncoder; vectors are cached under "<model>@stub"."""
+    import encoders
+    encoders.load_model = lambda model_name, backend=None: HashEncoder()
+    encoders.model_key = lambda model_name, backend=None: f"{model_name}@stub"
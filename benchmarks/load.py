@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import itertools
+import threading
+import http.client
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+
+PATHS = {
+    "pbn-search": "/linklist-pbn/search",
+    "pbn-webhook": "/linklist-pbn/webhook",
+    "client-search": "/linked-list-matcher/search",
+    "client-webhook": "/linked-list-matcher/webhook",
+}
+
+log = logging.info
+
+
+def latency_summary(seconds):
+    if not seconds:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0, "max_ms": 0.0}
+    ms = 1000 * np.asarray(seconds)
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "mean_ms": float(ms.mean()), "max_ms": float(ms.max())}
+
+
+def pbn_search_payloads(pbn, n, seed=0, batch=1, website_share=0.8):
+    # Dataset keywords with a word dropped or added, mostly scoped to their own website
+    rng = random.Random(seed)
+    rows = pbn.to_dict("records")
+    payloads = []
+    for _ in range(n):
+        picks = [rng.choice(rows) for _ in range(batch)]
+        keywords = []
+        for row in picks:
+            words = row["Main Keyword"].split()
+            if len(words) > 2 and rng.random() < 0.5:
+                words.pop(rng.randrange(len(words)))
+            elif rng.random() < 0.5:
+                words.append(rng.choice(synthetic.THAI_WORDS))
+            keywords.append(" ".join(words))
+        website = picks[0]["Website"] if rng.random() < website_share else ""
+        payloads.append({"keywords": keywords, "website": website})
+    return payloads
+
+
+def client_search_payloads(client, n, seed=0, batch=1):
+    # Keywords that exist, searched in their (SEO, project) or across the SEO, as the form sends them
+    rng = random.Random(seed)
+    groups = [g for _, g in client.groupby(["SEO Name", "Project Name"])]
+    payloads = []
+    for _ in range(n):
+        group = rng.choice(groups)
+        picks = group.sample(min(batch, len(group)), random_state=rng.randrange(2 ** 32))
+        payloads.append({
+            "keywords": picks["Keyword Name"].tolist(),
+            "seoName": group["SEO Name"].iat[0],
+            "projectName": group["Project Name"].iat[0] if rng.random() < 0.7 else "",
+        })
+    return payloads
+
+
+def webhook_payloads(records):
+    return [{"record": record} for record in records]
+
+
+def run_load(base_url, path, payloads, concurrency=1, requests=None, duration=None):
+    """POST `payloads` (cycled) to base_url + path from `concurrency` keep-alive connections.
+
+    Stops after `requests` requests or `duration` seconds, whichever comes first
+    (default: every payload once). Returns latency percentiles and throughput.
+    """
+    if requests is None and duration is None:
+        requests = len(payloads)
+    url = urlparse(base_url)
+    counter = itertools.count()
+    deadline = time.monotonic() + duration if duration else None
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection(url.hostname, url.port, timeout=120)
+        local, local_statuses = [], {}
+        while True:
+            i = next(counter)
+            if (requests is not None and i >= requests) or (deadline and time.monotonic() >= deadline):
+                break
+            body = json.dumps(payloads[i % len(payloads)], ensure_ascii=False).encode("utf-8")
+            started = time.perf_counter()
+            try:
+                conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+                res = conn.getresponse()
+                res.read()
+                status = res.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port, timeout=120)
+                status = "error"
+            local.append(time.perf_counter() - started)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.monotonic() - started
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "seconds": seconds,
+        "throughput_rps": len(latencies) / seconds if seconds else 0.0,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        **latency_summary(latencies),
+    }
+
+
+def scenario_payloads(scenario, dataset_dir, n, seed=0, batch=1):
+    # Payloads for a scenario from the synthetic files in `dataset_dir`
+    if scenario == "pbn-search":
+        return pbn_search_payloads(pd.read_csv(os.path.join(dataset_dir, "dataset_pbn.csv")), n, seed, batch)
+    if scenario == "client-search":
+        return client_search_payloads(pd.read_csv(os.path.join(dataset_dir, "dataset_client.csv")), n, seed, batch)
+    if scenario == "pbn-webhook":
+        pbn = pd.read_csv(os.path.join(dataset_dir, "dataset_pbn.csv"))
+        return webhook_payloads(synthetic.pbn_webhook_records(pbn, n, seed))
+    client = pd.read_csv(os.path.join(dataset_dir, "dataset_client.csv"))
+    with open(os.path.join(dataset_dir, "airtable.json"), "r", encoding="utf-8") as f:
+        tables = json.load(f)
+    return webhook_payloads(synthetic.client_webhook_records(client, tables, n, seed))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Drive a running app with synthetic searches or webhooks")
+    parser.add_argument("scenario", choices=sorted(PATHS))
+    parser.add_argument("--url", required=True, help="e.g. http://127.0.0.1:5003")
+    parser.add_argument("--dataset-dir", required=True, help="directory written by benchmarks.synthetic (the app must serve it)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--duration", type=float, help="seconds; overrides --requests")
+    parser.add_argument("--batch", type=int, default=1, help="keywords per search request")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    payloads = scenario_payloads(args.scenario, args.dataset_dir, min(args.requests, 5000), args.seed, args.batch)
+    report = run_load(args.url, PATHS[args.scenario], payloads, args.concurrency,
+                      requests=None if args.duration else args.requests, duration=args.duration)
+    log(f"📊 {json.dumps(report, indent=2)}")
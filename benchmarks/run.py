@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+
+from benchmarks import synthetic
+from benchmarks.load import PATHS, client_search_payloads, pbn_search_payloads, run_load, webhook_payloads
+from benchmarks.stub_airtable import StubAirtable
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_TIMEOUT = 3600  # a cold start with the real model encodes the whole dataset
+
+log = logging.info
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def post(base_url, path, payload):
+    req = urllib.request.Request(base_url + path, data=json.dumps(payload).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as res:
+            return res.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def wait_until(check, timeout, interval=0.05):
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if check():
+            return time.monotonic() - started
+        time.sleep(interval)
+    raise TimeoutError(f"not ready after {timeout}s")
+
+
+class AppProcess:
+    """One app served by serve.py from a work directory holding the synthetic dataset.
+
+    With `stub_encoder` it runs through benchmarks.stub_serve, which swaps the model for HashEncoder.
+    """
+
+    def __init__(self, app_name, workdir, env, workers, stub_encoder=False):
+        self.app_name = app_name
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_file = open(os.path.join(workdir, "server.log"), "ab")
+        started = time.monotonic()
+        serve = ["-m", "benchmarks.stub_serve"] if stub_encoder else [os.path.join(REPO, "serve.py")]
+        self.process = subprocess.Popen(
+            [sys.executable, *serve, app_name, "--host", "127.0.0.1",
+             "--port", str(self.port), "--workers", str(workers)],
+            cwd=workdir, env=env, stdout=self.log_file, stderr=subprocess.STDOUT,
+        )
+        self.bind_seconds = wait_until(lambda: self.probe("/healthz"), STARTUP_TIMEOUT, interval=0.05)
+        wait_until(lambda: self.probe("/readyz"), STARTUP_TIMEOUT, interval=0.2)
+        self.startup_seconds = time.monotonic() - started
+
+    def probe(self, path):
+        if self.process.poll() is not None:
+            raise RuntimeError(f"{self.app_name} exited with {self.process.returncode}, see server.log")
+        try:
+            with urllib.request.urlopen(self.url + path, timeout=5) as res:
+                return res.status == 200
+        except (OSError, urllib.error.HTTPError):
+            return False
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log_file.close()
+
+
+def bench_app(app_name, size, args, env, stats):
+    if args.work_dir:
+        os.makedirs(args.work_dir, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix=f"bench-{app_name}-{size}-", dir=args.work_dir)
+    pbn_rows, client_rows = (size, 100) if app_name == "app_pbn" else (100, size)
+    pbn, client, tables = synthetic.write_datasets(workdir, pbn_rows, client_rows, seed=args.seed)
+    stub = StubAirtable(tables, latency=args.airtable_latency).start()
+    env = {**env, "AIRTABLE_API_URL": stub.url}
+    prefix = "pbn" if app_name == "app_pbn" else "client"
+    results = []
+    app = AppProcess(app_name, workdir, env, args.workers, args.stub_encoder)
+    try:
+        encoder = "stub" if args.stub_encoder else env["ENCODER_BACKEND"]
+        base = {"app": app_name, "rows": size, "encoder": encoder, "workers": args.workers}
+        results.append({**base, "scenario": "startup", "seconds": app.startup_seconds, "bind_seconds": app.bind_seconds})
+        log(f"🚀 {app_name} with {size} rows answering after {app.bind_seconds:.1f}s, ready in {app.startup_seconds:.1f}s")
+
+        if app_name == "app_pbn":
+            payloads = pbn_search_payloads(pbn, min(args.requests, 5000), args.seed, args.batch)
+        else:
+            payloads = client_search_payloads(client, min(args.requests, 5000), args.seed, args.batch)
+        run_load(app.url, PATHS[f"{prefix}-search"], payloads[:50], 1)  # warm-up: query cache, first-request setup
+        for concurrency in args.concurrency:
+            report = run_load(app.url, PATHS[f"{prefix}-search"], payloads, concurrency, requests=args.requests)
+            results.append({**base, "scenario": f"{prefix}-search", **report})
+
+        # Webhooks: enqueue latency, then how long until the last record is searchable (queue flush + reload)
+        if app_name == "app_pbn":
+            records = synthetic.pbn_webhook_records(pbn, args.webhooks, args.seed, website="bench-new-site.com")
+            probe = lambda: post(app.url, PATHS["pbn-search"], {"keywords": ["probe"], "website": "bench-new-site.com"}) == 200
+        else:
+            records = synthetic.client_webhook_records(client, tables, args.webhooks, args.seed)
+            last = records[-1]["fields"]
+            seo = next(r["fields"]["Name"] for r in tables[synthetic.CLIENT_TABLES["seo_team"]] if r["id"] == last["SEO"][0])
+            keyword_name = last["Keyword"].split("-", 1)[1].strip()
+            probe = lambda: post(app.url, PATHS["client-search"], {"keywords": [keyword_name], "seoName": seo, "projectName": ""}) == 200
+        report = run_load(app.url, PATHS[f"{prefix}-webhook"], webhook_payloads(records), args.webhook_concurrency)
+        report["visible_after_seconds"] = wait_until(probe, args.reload_timeout)
+        results.append({**base, "scenario": f"{prefix}-webhook", **report})
+    finally:
+        app.stop()
+        stub.stop()
+        stats["airtable_requests"] = stats.get("airtable_requests", 0) + stub.requests
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def format_row(r):
+    if r["scenario"] == "startup":
+        return f"{r['app']:<10} {r['rows']:>8} {'startup':<15} {'':>5} {'':>8} {'':>9} {'':>9} {'':>9}  ready {r['seconds']:.2f}s, bound {r['bind_seconds']:.2f}s"
+    extra = f"  visible after {r['visible_after_seconds']:.2f}s" if "visible_after_seconds" in r else ""
+    return (f"{r['app']:<10} {r['rows']:>8} {r['scenario']:<15} {r['concurrency']:>5} {r['throughput_rps']:>8.1f} "
+            f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}  {r['statuses']}{extra}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Benchmark search, webhook and reload cost of both apps across dataset sizes")
+    parser.add_argument("--apps", default="app_pbn,app_client")
+    parser.add_argument("--sizes", default="1000,10000", help="dataset rows, comma separated")
+    parser.add_argument("--concurrency", default="1,8", help="search client threads, comma separated")
+    parser.add_argument("--requests", type=int, default=500, help="search requests per concurrency level")
+    parser.add_argument("--batch", type=int, default=1, help="keywords per search request")
+    parser.add_argument("--webhooks", type=int, default=200)
+    parser.add_argument("--webhook-concurrency", type=int, default=4)
+    parser.add_argument("--reload-timeout", type=float, default=600)
+    parser.add_argument("--workers", type=int, default=1, help="serve.py worker processes")
+    parser.add_argument("--stub-encoder", action="store_true", help="hash vectors instead of the model (benchmarks.stub_serve), no model cost")
+    parser.add_argument("--airtable-latency", type=float, default=0.0, help="seconds the stub Airtable adds per request")
+    parser.add_argument("--work-dir", default=None, help="where per-run directories go (default: system temp)")
+    parser.add_argument("--keep", action="store_true", help="keep per-run directories and server logs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write all results here")
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": REPO + os.pathsep + os.environ.get("PYTHONPATH", ""),
+        "ENCODER_BACKEND": os.getenv("ENCODER_BACKEND", "torch"),
+        "AIRTABLE_API_TOKEN_PBN": "bench", "AIRTABLE_BASE_ID_PBN": "appBenchPBN",
+        "AIRTABLE_TABLE_NAME_PBN": synthetic.PBN_MAIN_TABLE,
+        "AIRTABLE_API_TOKEN_CLIENT": "bench", "AIRTABLE_BASE_ID_CLIENT": "appBenchClient",
+        "EMBEDDING_CACHE_DIR": "embedding_cache",  # per run directory, so every size starts cold
+        "LOOKUP_CACHE_DIR": "lookup_cache",
+    }
+    env.pop("EMBEDDING_SERVER", None)
+
+    results, stats = [], {}
+    for app_name in args.apps.split(","):
+        for size in (int(s) for s in args.sizes.split(",")):
+            results.extend(bench_app(app_name, size, args, env, stats))
+
+    log(f"{'app':<10} {'rows':>8} {'scenario':<15} {'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        log(format_row(r))
+    log(f"🧪 Stub Airtable served {stats.get('airtable_requests', 0)} requests")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,111 @@
+import json
+import time
+import logging
+import argparse
+import threading
+from urllib.parse import parse_qs, unquote, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.info
+
+
+class StubAirtable:
+    """Airtable REST stand-in over in-memory tables, for AIRTABLE_API_URL.
+
+    Serves GET /v0/<base>/<table> (pageSize, offset, fields[]) and
+    GET /v0/<base>/<table>/<record id>. filterByFormula is ignored, so an
+    incremental sync reads every record. Optional per-request latency and a
+    requests-per-second limit answered with 429, like the real API.
+    """
+
+    def __init__(self, tables, host="127.0.0.1", port=0, latency=0.0, rate_limit=0):
+        self.tables = tables
+        self.by_id = {name: {r["id"]: r for r in records} for name, records in tables.items()}
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.requests = self.throttled = 0
+        self._window, self._window_count = 0, 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                status, body = stub.handle(self.path)
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_port}/v0"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="stub-airtable", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _throttle(self):
+        with self._lock:
+            self.requests += 1
+            if not self.rate_limit:
+                return False
+            second = int(time.monotonic())
+            if second != self._window:
+                self._window, self._window_count = second, 0
+            self._window_count += 1
+            if self._window_count > self.rate_limit:
+                self.throttled += 1
+                return True
+            return False
+
+    def handle(self, path):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._throttle():
+            return 429, {"errors": [{"error": "RATE_LIMIT_REACHED"}]}
+        url = urlparse(path)
+        parts = [unquote(p) for p in url.path.strip("/").split("/")]
+        if len(parts) not in (3, 4) or parts[0] != "v0" or parts[2] not in self.tables:
+            return 404, {"error": "NOT_FOUND"}
+        table = parts[2]
+        if len(parts) == 4:
+            record = self.by_id[table].get(parts[3])
+            return (200, record) if record else (404, {"error": "NOT_FOUND"})
+
+        params = parse_qs(url.query)
+        page_size = min(int(params.get("pageSize", ["100"])[0]), 100)
+        start = int(params.get("offset", ["0"])[0])
+        fields = params.get("fields[]")
+        records = self.tables[table][start:start + page_size]
+        if fields:
+            records = [{"id": r["id"], "fields": {k: v for k, v in r["fields"].items() if k in fields}} for r in records]
+        body = {"records": records}
+        if start + page_size < len(self.tables[table]):
+            body["offset"] = str(start + page_size)
+        return 200, body
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Serve synthetic Airtable tables (airtable.json from benchmarks.synthetic)")
+    parser.add_argument("tables", help="airtable.json")
+    parser.add_argument("--port", type=int, default=5090)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per second before 429, 0 = unlimited")
+    args = parser.parse_args()
+
+    with open(args.tables, "r", encoding="utf-8") as f:
+        stub = StubAirtable(json.load(f), port=args.port, latency=args.latency, rate_limit=args.rate_limit)
+    log(f"🧪 Stub Airtable on {stub.url} ({', '.join(f'{t}: {len(r)}' for t, r in stub.tables.items())})")
+    stub.server.serve_forever()
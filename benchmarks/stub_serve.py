@@ -0,0 +1,16 @@
+"""serve.py with HashEncoder in place of the model; the apps never load one outside benchmarks.
+
+    python -m benchmarks.stub_serve app_pbn --port 5003 --workers 2
+"""
+import os
+import sys
+import runpy
+
+from benchmarks import hash_encoder
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if __name__ == "__main__":
+    hash_encoder.install()  # before serve.py imports the app, which looks these up at import
+    sys.argv[0] = os.path.join(REPO, "serve.py")
+    runpy.run_path(sys.argv[0], run_name="__main__")
@@ -0,0 +1,200 @@
+import os
+import json
+import random
+import logging
+import argparse
+
+import pandas as pd
+
+THAI_WORDS = [
+    "โรงแรม", "ที่เที่ยว", "โอซาก้า", "โตเกียว", "เชียงใหม่", "ภูเก็ต", "กรุงเทพ", "ร้านอาหาร", "คาเฟ่", "รีวิว",
+    "ราคาถูก", "ใกล้ฉัน", "บัตรเครดิต", "สินเชื่อ", "ประกันรถยนต์", "ประกันสุขภาพ", "เงินกู้", "ดอกเบี้ย", "ผ่อน", "ออนไลน์",
+    "แจ้งความออนไลน์", "วิธี", "สมัคร", "ยื่นภาษี", "คอนโด", "บ้านมือสอง", "เช่า", "ซื้อ", "มือถือ", "โปรโมชั่น",
+    "ส่วนลด", "ครีมกันแดด", "สกินแคร์", "ลดน้ำหนัก", "ออกกำลังกาย", "คลินิก", "ทำฟัน", "เรียนภาษา", "คอร์ส", "ฟรี",
+]
+ENGLISH_WORDS = [
+    "hotel", "review", "best", "cheap", "near me", "osaka", "tokyo", "bangkok", "credit card", "loan",
+    "insurance", "condo", "rent", "buy", "2024", "2025", "guide", "how to", "online", "promotion",
+    "skincare", "clinic", "course", "free", "iphone", "samsung", "vpn", "hosting", "seo", "travel",
+]
+CATEGORIES = ["Travel", "Finance", "Insurance", "Property", "Beauty", "Health", "Education", "Technology", "Food", "Lifestyle"]
+BLOG_NAMES = ["Blog", "Review", "Guide", "News", "บทความ", "รีวิว"]  # the part before " - " in a client Keyword
+SEO_NAMES = ["Ann", "Bob", "Chai", "Dao", "Ek", "Fah", "Golf", "Hong", "Ice", "Jay", "Kai", "Lek"]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+PBN_COLUMNS = ["record_id", "Main Keyword", "🔗 Keyword Link", "Categories", "Website", "Last Modified"]
+CLIENT_COLUMNS = [
+    "Blog Name", "Keyword Name", "SEO Name", "Project Name", "Keyword", "url", "Month",
+    "Content Type", "Internal Link / External Link", "record_id",
+]
+# Same ids as fetch_airtable_client.TABLE_IDS (not imported: that module configures logging on import)
+CLIENT_TABLES = {"seo_team": "tbl8IsAhz0Iz0trrF", "project_list": "tbl47jwAiaLqdD7H6", "main_content": "tblEZLLELhP9q5QLH"}
+PBN_MAIN_TABLE = "PBN Keywords"
+
+log = logging.info
+
+
+def keyword(rng):
+    # Mostly Thai, sometimes mixed with English, 2-4 terms like real search phrases
+    words = THAI_WORDS if rng.random() < 0.7 else THAI_WORDS + ENGLISH_WORDS
+    return " ".join(rng.sample(words, rng.randint(2, 4)))
+
+
+def unique_keywords(rng, n, taken=()):
+    seen, out = set(taken), []
+    while len(out) < n:
+        kw = keyword(rng)
+        if kw in seen:
+            kw = f"{kw} {rng.randint(2, 9999)}"
+        if kw not in seen:
+            seen.add(kw)
+            out.append(kw)
+    return out
+
+
+def websites(n):
+    return [f"site-{i:03d}.com" for i in range(n)]
+
+
+def projects(n):
+    return [f"Project {i:02d}" for i in range(n)]
+
+
+def pbn_frame(n, n_websites=50, seed=0):
+    """n rows in the dataset_pbn.csv schema spread over n_websites websites."""
+    rng = random.Random(seed)
+    sites = websites(n_websites)
+    rows = []
+    for i, kw in enumerate(unique_keywords(rng, n)):
+        site = rng.choice(sites)
+        rows.append({
+            "record_id": f"recPBN{i:07d}",
+            "Main Keyword": kw,
+            "🔗 Keyword Link": f"<a href='https://{site}/p/{i}'>{kw}</a>",
+            "Categories": rng.choice(CATEGORIES),
+            "Website": site,
+            "Last Modified": "2024-01-01T00:00:00.000Z",
+        })
+    return pd.DataFrame(rows, columns=PBN_COLUMNS)
+
+
+def client_frame(n, n_seos=8, n_projects=20, seed=0):
+    """n rows in the dataset_client.csv schema; Keyword is "<Blog> - <Keyword Name>"."""
+    rng = random.Random(seed)
+    seos, project_names = SEO_NAMES[:n_seos], projects(n_projects)
+    rows = []
+    for i, kw in enumerate(unique_keywords(rng, n)):
+        blog = rng.choice(BLOG_NAMES)
+        rows.append({
+            "Blog Name": blog,
+            "Keyword Name": kw,
+            "SEO Name": rng.choice(seos),
+            "Project Name": rng.choice(project_names),
+            "Keyword": f"{blog} - {kw}",
+            "url": f"https://client-{i % 97}.com/{i}",
+            "Month": rng.choice(MONTHS),
+            "Content Type": "On Page",
+            "Internal Link / External Link": f"[{rng.choice(CATEGORIES)}](https://client-{i % 97}.com/)",
+            "record_id": f"recCLI{i:07d}",
+        })
+    return pd.DataFrame(rows, columns=CLIENT_COLUMNS)
+
+
+def airtable_tables(pbn, client):
+    """Airtable-shaped tables behind both datasets, for the stub server."""
+    site_ids = {site: f"recWEB{i:05d}" for i, site in enumerate(sorted(pbn["Website"].unique()))}
+    category_ids = {cat: f"recCAT{i:05d}" for i, cat in enumerate(sorted(pbn["Categories"].unique()))}
+    seo_ids = {seo: f"recSEO{i:05d}" for i, seo in enumerate(sorted(client["SEO Name"].unique()))}
+    project_ids = {p: f"recPRJ{i:05d}" for i, p in enumerate(sorted(client["Project Name"].unique()))}
+    return {
+        "Website": [{"id": rid, "fields": {"Name": site}} for site, rid in site_ids.items()],
+        "Categories": [{"id": rid, "fields": {"Name": cat}} for cat, rid in category_ids.items()],
+        PBN_MAIN_TABLE: [
+            {"id": r["record_id"], "fields": {
+                "Main Keyword": r["Main Keyword"],
+                "🔗 Keyword Link": r["🔗 Keyword Link"],
+                "Website": [site_ids[r["Website"]]],
+                "Categories": [category_ids[r["Categories"]]],
+                "Last Modified": r["Last Modified"],
+            }}
+            for r in pbn.to_dict("records")
+        ],
+        CLIENT_TABLES["seo_team"]: [{"id": rid, "fields": {"Name": seo}} for seo, rid in seo_ids.items()],
+        CLIENT_TABLES["project_list"]: [{"id": rid, "fields": {"Project": p}} for p, rid in project_ids.items()],
+        CLIENT_TABLES["main_content"]: [
+            {"id": r["record_id"], "fields": {
+                "Keyword": r["Keyword"],
+                "url": r["url"],
+                "Month": r["Month"],
+                "SEO": [seo_ids[r["SEO Name"]]],
+                "Project": [project_ids[r["Project Name"]]],
+                "Content Type": r["Content Type"],
+                "Internal Link / External Link": r["Internal Link / External Link"],
+            }}
+            for r in client.to_dict("records")
+        ],
+    }
+
+
+def pbn_webhook_records(pbn, n, seed=0, website=None):
+    """n new PBN records as the webhook receives them (already mapped to names)."""
+    rng = random.Random(seed)
+    sites = sorted(pbn["Website"].unique())
+    records = []
+    for i, kw in enumerate(unique_keywords(rng, n, taken=pbn["Main Keyword"])):
+        site = website or rng.choice(sites)
+        record_id = f"recHOOK{seed:03d}{i:06d}"
+        records.append({"id": record_id, "fields": {
+            "record_id": record_id,
+            "Main Keyword": kw,
+            "🔗 Keyword Link": f"<a href='https://{site}/new/{i}'>{kw}</a>",
+            "Categories": rng.choice(CATEGORIES),
+            "Website": site,
+            "Last Modified": "2024-06-01T00:00:00.000Z",
+        }})
+    return records
+
+
+def client_webhook_records(client, tables, n, seed=0):
+    """n new client records as Airtable sends them, with linked SEO / Project ids."""
+    rng = random.Random(seed)
+    seo_ids = [r["id"] for r in tables[CLIENT_TABLES["seo_team"]]]
+    project_ids = [r["id"] for r in tables[CLIENT_TABLES["project_list"]]]
+    records = []
+    for i, kw in enumerate(unique_keywords(rng, n, taken=client["Keyword Name"])):
+        records.append({"id": f"recHOOK{seed:03d}{i:06d}", "fields": {
+            "Keyword": f"{rng.choice(BLOG_NAMES)} - {kw}",
+            "url": f"https://client-new.com/{i}",
+            "Month": rng.choice(MONTHS),
+            "SEO": [rng.choice(seo_ids)],
+            "Project": [rng.choice(project_ids)],
+            "Content Type": "On Page",
+            "Internal Link / External Link": "",
+        }})
+    return records
+
+
+def write_datasets(directory, pbn_rows, client_rows, seed=0):
+    """Write dataset_pbn.csv, dataset_client.csv and airtable.json into `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    pbn = pbn_frame(pbn_rows, n_websites=max(1, min(200, pbn_rows // 200)), seed=seed)
+    client = client_frame(client_rows, seed=seed + 1)
+    pbn.to_csv(os.path.join(directory, "dataset_pbn.csv"), index=False)
+    client.to_csv(os.path.join(directory, "dataset_client.csv"), index=False)
+    tables = airtable_tables(pbn, client)
+    with open(os.path.join(directory, "airtable.json"), "w", encoding="utf-8") as f:
+        json.dump(tables, f, ensure_ascii=False)
+    log(f"🧪 Wrote {pbn_rows} PBN and {client_rows} client rows to {directory}")
+    return pbn, client, tables
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Generate synthetic dataset_pbn.csv / dataset_client.csv and matching Airtable tables")
+    parser.add_argument("directory")
+    parser.add_argument("--pbn-rows", type=int, default=10000)
+    parser.add_argument("--client-rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_datasets(args.directory, args.pbn_rows, args.client_rows, args.seed)
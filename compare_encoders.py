@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import logging
+import argparse
+import importlib
+from collections import Counter
+
+import numpy as np
+
+log = logging.info
+
+
+def percentile_ms(seconds, q):
+    return 1000 * float(np.percentile(seconds, q)) if seconds else 0.0
+
+
+def measure_latency(encoder, texts, bulk_texts):
+    # One query at a time, as a search request encodes it, then one bulk batch as a reload does
+    single = []
+    for text in texts:
+        started = time.perf_counter()
+        encoder.encode([text], normalize_embeddings=True)
+        single.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    encoder.encode(bulk_texts, normalize_embeddings=True)
+    bulk_seconds = time.perf_counter() - started
+    return {
+        "query_p50_ms": percentile_ms(single, 50),
+        "query_p95_ms": percentile_ms(single, 95),
+        "bulk_texts_per_second": len(bulk_texts) / bulk_seconds if bulk_seconds else 0.0,
+    }
+
+
+def overlap(baseline, candidate):
+    # (baseline results also returned by the candidate, baseline results, identical lists);
+    # counted as multisets because one keyword can appear on several rows
+    return sum((Counter(baseline) & Counter(candidate)).values()), len(baseline), baseline == candidate
+
+
+def replay_pbn(app, snap, sample, vecs_by_backend, query_vecs_by_backend):
+    # Each sampled keyword is searched within its own website, through the app's own build_result
+    totals = {"matched": [0, 0], "suggested": [0, 0], "identical": 0}
+    for q, row in enumerate(sample):
+        rows = snap.website_slices[snap.df["WebsiteName"].iat[row]]
+        results = []
+        for backend, keyword_vecs in vecs_by_backend.items():
+            sims = query_vecs_by_backend[backend][q] @ keyword_vecs[rows].T
+            results.append(app.build_result(snap, snap.keywords[row], snap.keywords[row], np.arange(rows.start, rows.stop), sims))
+        identical = True
+        for key, field in (("matched", "matched_keywords"), ("suggested", "suggested_keywords")):
+            kept, total, same = overlap(results[0][field], results[1][field])
+            totals[key][0] += kept
+            totals[key][1] += total
+            identical &= same
+        totals["identical"] += identical
+    return {
+        "queries": len(sample),
+        "matched_recall": totals["matched"][0] / totals["matched"][1] if totals["matched"][1] else 1.0,
+        "matched_results": totals["matched"][1],
+        "suggested_recall": totals["suggested"][0] / totals["suggested"][1] if totals["suggested"][1] else 1.0,
+        "suggested_results": totals["suggested"][1],
+        "identical_fraction": totals["identical"] / len(sample) if sample else 1.0,
+    }
+
+
+def replay_client(app, snap, sample, vecs_by_backend, query_vecs_by_backend):
+    # Each sampled row is searched within its (SEO, project) pair, like a search that found it
+    kept = total = identical = 0
+    for q, row in enumerate(sample):
+        key = (snap.df["SEO Name"].iat[row], snap.df["Project Name"].iat[row])
+        rows = snap.partitions[key]
+        results = []
+        for backend, keyword_vecs in vecs_by_backend.items():
+            sims = query_vecs_by_backend[backend][q] @ keyword_vecs[rows].T
+            model_output, _ = app.select_outputs(snap.keyword_names, snap.keywords[row], np.arange(rows.start, rows.stop), sims)
+            result = app.build_result(snap, row, model_output)
+            results.append([item["text"] for item in result["model_output"]])
+        k, t, same = overlap(results[0], results[1])
+        kept, total, identical = kept + k, total + t, identical + same
+    return {
+        "queries": len(sample),
+        "recall": kept / total if total else 1.0,
+        "results": total,
+        "identical_fraction": identical / len(sample) if sample else 1.0,
+    }
+
+
+def compare(app_name, baseline, candidate, n_queries, n_bulk, seed):
+    # The app is imported as-is, so it loads its dataset and keyword vectors with the baseline backend
+    # (encoders reads ENCODER_BACKEND on import, hence the late imports)
+    os.environ["ENCODER_BACKEND"] = baseline
+    from encoders import load_encoder, model_key
+    from embedding_store import EmbeddingStore
+    app = importlib.import_module(app_name)
+    app.warmup.wait()
+    app.snapshot_watcher.stop()  # both backends are replayed against the same snapshot
+    snap = app.snapshot
+
+    cand_encoder = load_encoder(app.MODEL_NAME, candidate)
+    vecs_by_backend = {
+        baseline: np.asarray(snap.keyword_vecs),
+        candidate: EmbeddingStore(model_key(app.MODEL_NAME, candidate)).encode(snap.keywords, cand_encoder),
+    }
+    encoders = {baseline: app.embedder, candidate: cand_encoder}
+
+    rng = np.random.default_rng(seed)
+    sample = sorted(rng.choice(len(snap.keywords), size=min(n_queries, len(snap.keywords)), replace=False).tolist())
+    texts = [snap.keywords[row] for row in sample]
+    query_vecs_by_backend = {
+        backend: np.asarray(encoder.encode(texts, normalize_embeddings=True), dtype=np.float32)
+        for backend, encoder in encoders.items()
+    }
+
+    report = {
+        "app": app_name,
+        "model": app.MODEL_NAME,
+        "rows": len(snap.keywords),
+        "baseline": baseline,
+        "candidate": candidate,
+        # Same model on both backends, so the vectors themselves should nearly coincide
+        "mean_vector_cosine": float(np.mean(np.sum(vecs_by_backend[baseline] * vecs_by_backend[candidate], axis=1))),
+    }
+    if app_name == "app_pbn":
+        report["thresholds"] = {"hard": app.HARD_THRES, "soft": app.SOFT_THRES}
+        report.update(replay_pbn(app, snap, sample, vecs_by_backend, query_vecs_by_backend))
+    else:
+        report["thresholds"] = {"soft": app.SOFT_THRES}
+        report.update(replay_client(app, snap, sample, vecs_by_backend, query_vecs_by_backend))
+
+    bulk = [snap.keywords[row] for row in rng.choice(len(snap.keywords), size=min(n_bulk, len(snap.keywords)), replace=False)]
+    report["latency"] = {backend: measure_latency(encoder, texts[:200], bulk) for backend, encoder in encoders.items()}
+    app.webhook_queue.flush()
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Compare two ENCODER_BACKENDs on an app's dataset: result recall and encode latency")
+    parser.add_argument("app", choices=["app_pbn", "app_client"])
+    parser.add_argument("--baseline", default="torch", choices=["torch", "onnx", "int8"])
+    parser.add_argument("--candidate", default="int8", choices=["torch", "onnx", "int8"])
+    parser.add_argument("--queries", type=int, default=1000, help="dataset keywords replayed as searches")
+    parser.add_argument("--bulk", type=int, default=1000, help="keywords in the bulk throughput batch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report here")
+    args = parser.parse_args()
+    if args.baseline == args.candidate:
+        parser.error("--baseline and --candidate must differ")
+    if os.getenv("EMBEDDING_SERVER"):
+        parser.error("unset EMBEDDING_SERVER: both backends must run in this process")
+
+    report = compare(args.app, args.baseline, args.candidate, args.queries, args.bulk, args.seed)
+    log(f"📊 {json.dumps(report, indent=2, ensure_ascii=False)}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import math
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+DATASET_COMPACT_SEGMENTS = int(os.getenv("DATASET_COMPACT_SEGMENTS", "20"))  # compact once this many delta segments exist
+MANIFEST_FILE = "manifest.json"
+DELETED_COLUMN = "__deleted__"  # tombstone marker written by delete()
+LOCK_FILE = ".lock"
+
+log = logging.info
+
+
+def _cell(value):
+    # Store what a CSV round trip would give back: text, with empty cells as nulls
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value == "":
+        return None
+    return str(value)
+
+
+class DatasetStore:
+    """Columnar dataset: a Parquet base file plus append-only Parquet delta segments.
+
+    append() writes only the updated rows as a new segment; read() memory-maps the
+    base and segments and keeps the last row per key, which matches the old
+    "drop existing duplicates, concat, rewrite CSV" behaviour. Deleted keys are
+    tombstone rows in a segment. compact() folds the segments back into a new base. manifest.json lists the live files and a version
+    number that changes on every write, which is what the apps watch for reloads.
+    """
+
+    def __init__(self, path, key, csv_path=None):
+        self.dir = path
+        self.key = key
+        self.manifest_path = os.path.join(path, MANIFEST_FILE)
+        self._lock = threading.Lock()
+        self._manifest_mtime = None
+        self._version = 0
+        if not self.exists() and csv_path and os.path.exists(csv_path):
+            self._import_csv(csv_path)
+
+    # ---------- manifest ----------
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def _read_manifest(self):
+        if not self.exists():
+            return {"version": 0, "base": None, "segments": []}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.dir, exist_ok=True)
+        with self._lock, open(os.path.join(self.dir, LOCK_FILE), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def version(self):
+        """Current dataset version; a stat per call, the manifest is only re-read when it changed."""
+        if not self.exists():
+            return 0
+        mtime = os.path.getmtime(self.manifest_path)
+        if mtime != self._manifest_mtime:
+            self._version = self._read_manifest()["version"]
+            self._manifest_mtime = mtime
+        return self._version
+
+    # ---------- writes ----------
+
+    def _write_table(self, name, df):
+        table = pa.Table.from_pandas(
+            pd.DataFrame({col: df[col].map(_cell) for col in df.columns}, columns=list(df.columns)),
+            schema=pa.schema([(str(col), pa.string()) for col in df.columns]),
+            preserve_index=False,
+        )
+        pq.write_table(table, os.path.join(self.dir, name))
+
+    def _import_csv(self, csv_path):
+        df = pd.read_csv(csv_path, dtype=str)
+        with self._file_lock():
+            if self.exists():
+                return
+            self._write_table("base-1.parquet", df)
+            self._write_manifest({"version": 1, "base": "base-1.parquet", "segments": []})
+        log(f"📦 Imported {len(df)} rows from {csv_path} into {self.dir}")
+
+    def ensure(self, columns):
+        """Create an empty dataset with these columns if there is none yet."""
+        if not self.exists():
+            self.append(pd.DataFrame(columns=columns))
+
+    def append(self, df, delete=()):
+        """Write `df` as a new delta segment; its rows replace earlier rows with the same key.
+
+        Keys in `delete` are removed in the same segment.
+        """
+        if len(df.columns) and self.key not in df.columns:
+            raise ValueError(f"❌ '{self.key}' column missing in update.")
+        delete = [k for k in delete if k is not None]
+        if delete:
+            tombstones = pd.DataFrame({self.key: delete, DELETED_COLUMN: "1"})
+            df = pd.concat([df, tombstones], ignore_index=True) if len(df.columns) else tombstones
+        with self._file_lock():
+            manifest = self._read_manifest()
+            version = manifest["version"] + 1
+            name = f"delta-{version}.parquet"
+            self._write_table(name, df)
+            manifest["segments"].append(name)
+            manifest["version"] = version
+            self._write_manifest(manifest)
+            segments = len(manifest["segments"])
+        log(f"📦 Wrote {len(df) - len(delete)} rows, {len(delete)} deletions to {self.dir}/{name} (version {version}, {segments} delta segments)")
+        if segments >= DATASET_COMPACT_SEGMENTS:
+            self.compact()
+        return version
+
+    def delete(self, keys):
+        """Remove the rows with these keys; returns the new version."""
+        return self.append(pd.DataFrame(), delete=keys)
+
+    def compact(self):
+        """Fold all delta segments into a fresh base file."""
+        with self._file_lock():
+            manifest = self._read_manifest()
+            if not manifest["segments"]:
+                return manifest["version"]
+            table = self._read_table(manifest)
+            version = manifest["version"] + 1
+            name = f"base-{version}.parquet"
+            pq.write_table(table, os.path.join(self.dir, name))
+            old_files = ([manifest["base"]] if manifest["base"] else []) + manifest["segments"]
+            self._write_manifest({"version": version, "base": name, "segments": []})
+        for old in old_files:
+            try:
+                os.remove(os.path.join(self.dir, old))
+            except FileNotFoundError:
+                pass
+        log(f"🧹 Compacted {self.dir}: {len(old_files)} files -> {name} ({table.num_rows} rows)")
+        return version
+
+    # ---------- reads ----------
+
+    def _read_table(self, manifest, columns=None):
+        files = ([manifest["base"]] if manifest["base"] else []) + manifest["segments"]
+        tables = []
+        for name in files:
+            path = os.path.join(self.dir, name)
+            file_columns = None
+            if columns is not None:
+                wanted = set(columns) | {self.key, DELETED_COLUMN}
+                file_columns = [c for c in pq.read_schema(path).names if c in wanted]
+            tables.append(pq.read_table(path, columns=file_columns, memory_map=True))
+        if not tables:
+            return pa.table({})
+        table = pa.concat_tables(tables, promote_options="default") if len(tables) > 1 else tables[0]
+        if self.key in table.column_names:
+            keys = table.column(self.key).to_pandas()
+            keep = np.flatnonzero((~keys.duplicated(keep="last") | keys.isna()).to_numpy())
+            if len(keep) < table.num_rows:
+                table = table.take(pa.array(keep))
+        if DELETED_COLUMN in table.column_names:
+            table = table.filter(pc.is_null(table.column(DELETED_COLUMN)))
+            table = table.select([c for c in table.column_names if c != DELETED_COLUMN])
+        return table
+
+    def read_table(self, columns=None):
+        """Deduplicated dataset as a memory-mapped Arrow table, optionally only some columns."""
+        with self._file_lock():  # compaction may delete segments under a lock-free reader
+            return self._read_table(self._read_manifest(), columns)
+
+    def read(self):
+        """Deduplicated dataset as a DataFrame, with nulls as NaN like pd.read_csv."""
+        df = self.read_table().to_pandas()
+        return df.where(df.notna(), np.nan)
+
+    def export_csv(self, csv_path):
+        self.read().to_csv(csv_path, index=False)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    # python dataset_store.py compact <dir> <key>
+    # python dataset_store.py export <dir> <key> <csv_path>
+    command, path, key = sys.argv[1:4]
+    store = DatasetStore(path, key)
+    if command == "compact":
+        store.compact()
+    elif command == "export":
+        store.export_csv(sys.argv[4])
+        log(f"✅ Exported {path} to {sys.argv[4]}")
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from encoders import BACKENDS, ENCODER_BACKEND, BatchingEncoder, load_model, model_key
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
+EMBEDDING_SERVER_BIND = os.getenv("EMBEDDING_SERVER_BIND", "127.0.0.1:5005")  # "host:port" or "unix:///path.sock"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))           # model batch size inside one request
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("embedding_server.log", encoding="utf-8"),
+        logging.StreamHandler()
+    ],
+    force=True
+)
+log = logging.info
+
+
+class EmbeddingService:
+    """One model instance shared by every app that points EMBEDDING_SERVER here."""
+
+    def __init__(self, model_name, backend=ENCODER_BACKEND):
+        self.model_name = model_key(model_name, backend)  # what clients must ask for
+        # Requests from both apps are coalesced; one forward pass at a time, the model parallelises internally
+        self.model = BatchingEncoder(load_model(model_name, backend))
+        self._lock = threading.Lock()
+        self.requests = self.texts = 0
+        self.encode_seconds = 0.0
+
+    def encode(self, texts, normalize):
+        started = time.monotonic()
+        vecs = self.model.encode(texts, batch_size=EMBEDDING_BATCH_SIZE, normalize_embeddings=normalize)
+        with self._lock:
+            self.encode_seconds += time.monotonic() - started
+            self.requests += 1
+            self.texts += len(texts)
+        return np.ascontiguousarray(vecs, dtype=np.float32)
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "requests": self.requests,
+            "texts": self.texts,
+            "encode_seconds": self.encode_seconds,
+            "batching": self.model.stats(),
+        }
+
+
+class EncodeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, the apps reuse one connection per thread
+    service = None
+
+    def _reply(self, status, body, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply_json(self, status, payload):
+        self._reply(status, json.dumps(payload).encode("utf-8"))
+
+    def do_POST(self):
+        if self.path != "/encode":
+            return self._reply_json(404, {"error": "not found"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            texts = request["texts"]
+        except (ValueError, KeyError, TypeError) as e:  # TypeError: a JSON body that is not an object
+            return self._reply_json(400, {"error": f"bad request: {e}"})
+        if not isinstance(texts, list) or not texts or not all(isinstance(text, str) for text in texts):
+            return self._reply_json(400, {"error": "bad request: 'texts' must be a non-empty list of strings"})
+        if request.get("model", self.service.model_name) != self.service.model_name:
+            return self._reply_json(400, {"error": f"this server runs {self.service.model_name}, not {request['model']}"})
+        try:
+            vecs = self.service.encode(texts, bool(request.get("normalize", False)))
+        except Exception as e:
+            log(f"❌ Encode failed: {e}")
+            return self._reply_json(500, {"error": str(e)})
+        self._reply(200, vecs.tobytes(), "application/octet-stream", {"X-Embedding-Dim": str(vecs.shape[1])})
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            return self._reply_json(200, {"status": "ok", "model": self.service.model_name})
+        if self.path == "/stats":
+            return self._reply_json(200, self.service.stats())
+        return self._reply_json(404, {"error": "not found"})
+
+    def address_string(self):
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(bind, service):
+    EncodeHandler.service = service
+    if bind.startswith("unix://"):
+        path = bind[len("unix://"):]
+        if os.path.exists(path):
+            os.remove(path)  # stale socket from a previous run
+        return ThreadingUnixHTTPServer(path, EncodeHandler)
+    host, port = bind.rsplit(":", 1)
+    return ThreadingHTTPServer((host, int(port)), EncodeHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve batched sentence embeddings to app_pbn / app_client")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--backend", default=ENCODER_BACKEND, choices=BACKENDS)
+    parser.add_argument("--bind", default=EMBEDDING_SERVER_BIND)
+    args = parser.parse_args()
+
+    service = EmbeddingService(args.model, args.backend)
+    server = make_server(args.bind, service)
+    log(f"🚀 Embedding server for {service.model_name} listening on {args.bind}")
+    server.serve_forever()
@@ -0,0 +1,339 @@
+import os
+import re
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "10000"))
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+
+log = logging.info
+
+
+def text_key(model_name, text):
+    return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _today():
+    return int(time.time() // 86400)
+
+
+def reuse_vectors(old_keys, old_texts, old_vecs, new_keys, new_texts, encode):
+    """Build the vector matrix for a new snapshot from the previous one.
+
+    Rows are paired by key; a row whose text is unchanged reuses its old vector and
+    only added or changed rows go through `encode`. Returns (vectors, n_encoded).
+    """
+    old_keys = pd.Index(old_keys)
+    first = ~old_keys.duplicated()
+    old_positions = np.flatnonzero(first)
+    pos = old_keys[first].get_indexer(pd.Index(new_keys))
+
+    new_texts = np.asarray(new_texts, dtype=object)
+    old_texts = np.asarray(old_texts, dtype=object)
+    found = pos >= 0
+    old_rows = old_positions[pos[found]]
+    unchanged = np.zeros(len(new_texts), dtype=bool)
+    unchanged[found] = old_texts[old_rows] == new_texts[found]
+
+    dim = old_vecs.shape[1] if len(old_vecs) else None
+    to_encode = np.flatnonzero(~unchanged)
+    encoded = encode(new_texts[to_encode].tolist()) if len(to_encode) else None
+    if dim is None:
+        dim = encoded.shape[1] if encoded is not None and len(encoded) else 0
+
+    vecs = np.empty((len(new_texts), dim), dtype=np.float32)
+    vecs[unchanged] = old_vecs[old_positions[pos[unchanged]]]
+    if encoded is not None:
+        vecs[to_encode] = encoded
+    return vecs, len(to_encode)
+
+
+class EmbeddingStore:
+    """On-disk cache of normalized embeddings keyed by hash(model name, cleaned text).
+
+    Vectors live in a flat float32 file that is memory-mapped for reads; index.json
+    is the sidecar mapping each key to its row and the day it was last used, as of
+    the last compaction. Keys added since (and last-used days bumped) are appended
+    as "<key> <day>" lines to a log next to the vector file, so a write costs the
+    size of the update; compact() folds the log into index.json. The directory can
+    be shared by several processes (both apps mount the same volume), so writes take
+    an flock and first read what other processes appended.
+    """
+
+    def __init__(self, model_name, cache_dir=EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.dir = os.path.join(cache_dir, re.sub(r"[^\w.-]+", "_", model_name))
+        os.makedirs(self.dir, exist_ok=True)
+        self.index_path = os.path.join(self.dir, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._index_mtime = None
+        self._load_index()
+
+    # ---------- sidecar / vector file ----------
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self._index_mtime = os.path.getmtime(self.index_path)
+        else:
+            index = {"model": self.model_name, "dim": None, "vectors_file": "vectors-0.f32", "keys": [], "last_used": []}
+        self.dim = index["dim"]
+        self.vectors_file = index["vectors_file"]
+        self.keys = index["keys"]
+        self.last_used = index["last_used"]
+        self.rows = {key: i for i, key in enumerate(self.keys)}
+        self.log_file = os.path.splitext(self.vectors_file)[0] + ".log"  # one log per vector file generation
+        self._log_offset = 0
+        self._read_log()
+        self._open_vectors()
+
+    def _refresh_index(self):
+        if os.path.exists(self.index_path) and os.path.getmtime(self.index_path) != self._index_mtime:
+            self._load_index()  # compacted by another process
+        elif self._read_log():
+            self._open_vectors()
+
+    def _read_log(self):
+        # Replays log lines written since the last read; returns how many keys they added
+        path = os.path.join(self.dir, self.log_file)
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # a line still being written is read next time
+        added = 0
+        for line in data[:end].decode("utf-8").splitlines():
+            key, day = line.split()
+            row = self.rows.get(key)
+            if row is None:
+                self.rows[key] = len(self.keys)
+                self.keys.append(key)
+                self.last_used.append(int(day))
+                added += 1
+            else:
+                self.last_used[row] = int(day)
+        self._log_offset += end
+        return added
+
+    def _write_log(self, entries):
+        data = "".join(f"{key} {day}\n" for key, day in entries).encode("utf-8")
+        with open(os.path.join(self.dir, self.log_file), "ab") as f:
+            f.truncate(self._log_offset)  # drop a line a crashed writer left unfinished
+            f.write(data)
+        self._log_offset += len(data)
+
+    def _save_index(self, keys, last_used):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "model": self.model_name,
+                "dim": self.dim,
+                "vectors_file": self.vectors_file,
+                "keys": keys,
+                "last_used": last_used,
+            }, f)
+        os.replace(tmp_path, self.index_path)
+        self._index_mtime = os.path.getmtime(self.index_path)
+
+    def _open_vectors(self):
+        path = os.path.join(self.dir, self.vectors_file)
+        if self.keys and os.path.exists(path):
+            self.vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(len(self.keys), self.dim))
+        else:
+            self.vectors = np.empty((0, self.dim or 0), dtype=np.float32)
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock, open(os.path.join(self.dir, LOCK_FILE), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ---------- public API ----------
+
+    def encode(self, texts, embedder):
+        """Return normalized vectors for `texts`, encoding only texts never seen before."""
+        keys = [text_key(self.model_name, t) for t in texts]
+
+        with self._lock:
+            self._refresh_index()
+            missing = {k: t for k, t in zip(keys, texts) if k not in self.rows}
+
+        new_vecs = None
+        if missing:
+            log(f"🧠 Encoding {len(missing)} new texts (cached: {len(set(keys)) - len(missing)})")
+            new_vecs = np.asarray(embedder.encode(list(missing.values()), normalize_embeddings=True), dtype=np.float32)
+
+        with self._file_lock():
+            self._refresh_index()
+            if missing:
+                self._append(list(missing.keys()), new_vecs)
+            today = _today()
+            rows = [self.rows[k] for k in keys]
+            touched = [row for row in set(rows) if self.last_used[row] != today]
+            if touched:
+                for row in touched:
+                    self.last_used[row] = today
+                self._write_log((self.keys[row], today) for row in sorted(touched))
+            if not rows:
+                return np.empty((0, self.dim or 0), dtype=np.float32)
+            return np.asarray(self.vectors[rows])
+
+    def lookup(self, texts):
+        """(vectors, found) for already cached `texts`; never encodes and leaves last-used days alone."""
+        keys = [text_key(self.model_name, t) for t in texts]
+        with self._lock:
+            self._refresh_index()
+            rows = np.array([self.rows.get(k, -1) for k in keys], dtype=np.int64)
+            vectors = self.vectors
+        found = rows >= 0
+        out = np.zeros((len(keys), vectors.shape[1]), dtype=np.float32)
+        out[found] = vectors[rows[found]]
+        return out, found
+
+    def _append(self, keys, vecs):
+        keep = [i for i, k in enumerate(keys) if k not in self.rows]  # another process may have added some
+        if not keep:
+            return
+        vecs = vecs[keep]
+        if self.dim is None:
+            self.dim = int(vecs.shape[1])
+            self._save_index([], [])  # first write into an empty cache: records dim, every key goes to the log
+        with open(os.path.join(self.dir, self.vectors_file), "ab") as f:
+            f.truncate(len(self.keys) * self.dim * 4)  # drop rows a crashed writer left without a log entry
+            f.write(vecs.tobytes())
+        today = _today()
+        for i in keep:
+            self.rows[keys[i]] = len(self.keys)
+            self.keys.append(keys[i])
+            self.last_used.append(today)
+        self._write_log((keys[i], today) for i in keep)
+        self._open_vectors()
+
+    def compact(self, max_entries=None, max_age_days=None):
+        """Evict entries unused for `max_age_days` and/or beyond the `max_entries` most recent, and fold the log into index.json."""
+        with self._file_lock():
+            self._refresh_index()
+            keep = list(range(len(self.keys)))
+            if max_age_days is not None:
+                cutoff = _today() - max_age_days
+                keep = [i for i in keep if self.last_used[i] >= cutoff]
+            if max_entries is not None and len(keep) > max_entries:
+                keep = sorted(keep, key=lambda i: self.last_used[i], reverse=True)[:max_entries]
+                keep.sort()
+            removed = len(self.keys) - len(keep)
+            if removed == 0 and not os.path.exists(os.path.join(self.dir, self.log_file)):
+                return 0
+
+            # Always a new generation, so processes still reading the old log never see it rewritten
+            old_path = os.path.join(self.dir, self.vectors_file)
+            old_log = os.path.join(self.dir, self.log_file)
+            generation = int(re.search(r"(\d+)", self.vectors_file).group(1)) + 1
+            self.vectors_file = f"vectors-{generation}.f32"
+            with open(os.path.join(self.dir, self.vectors_file), "wb") as f:
+                f.write(np.asarray(self.vectors[keep], dtype=np.float32).tobytes())
+            self.keys = [self.keys[i] for i in keep]
+            self.last_used = [self.last_used[i] for i in keep]
+            self.rows = {key: i for i, key in enumerate(self.keys)}
+            self.log_file = os.path.splitext(self.vectors_file)[0] + ".log"
+            self._log_offset = 0
+            self._save_index(self.keys, self.last_used)
+            self._open_vectors()
+            os.remove(old_path)
+            if os.path.exists(old_log):
+                os.remove(old_log)
+            log(f"🧹 Compacted embedding cache: removed {removed}, kept {len(self.keys)}")
+            return removed
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "entries": len(self.keys),
+            "dim": self.dim,
+            "bytes": len(self.keys) * (self.dim or 0) * 4,
+        }
+
+
+class QueryEmbeddingCache:
+    """Bounded in-process LRU of query vectors keyed by (model name, cleaned query)."""
+
+    def __init__(self, model_name, capacity=QUERY_CACHE_SIZE):
+        self.model_name = model_name
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def encode(self, texts, embedder):
+        """Return normalized vectors for `texts`; only cache misses reach the model, in one batch."""
+        keys = [(self.model_name, t) for t in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                vec = self._entries.get(key)
+                if vec is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vec
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            vecs = np.asarray(embedder.encode([t for _, t in missing], normalize_embeddings=True), dtype=np.float32)
+            with self._lock:
+                for key, vec in zip(missing, vecs):
+                    found[key] = vec
+                    self._entries[key] = vec
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "capacity": self.capacity,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Inspect or compact the on-disk embedding cache")
+    parser.add_argument("command", choices=["stats", "compact"])
+    parser.add_argument("--model", default="all-mpnet-base-v2")
+    parser.add_argument("--cache-dir", default=EMBEDDING_CACHE_DIR)
+    parser.add_argument("--max-entries", type=int)
+    parser.add_argument("--max-age-days", type=int)
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.model, args.cache_dir)
+    if args.command == "compact":
+        store.compact(max_entries=args.max_entries, max_age_days=args.max_age_days)
+    log(f"📦 {store.stats()}")
@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+import http.client
+from urllib.parse import urlparse
+
+import numpy as np
+
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")                       # torch | onnx | int8 (dynamically quantized torch)
+ENCODER_ONNX_FILE = os.getenv("ENCODER_ONNX_FILE", "")                         # onnx backend: file in the model repo, e.g. onnx/model_qint8_avx512.onnx
+EMBEDDING_SERVER = os.getenv("EMBEDDING_SERVER", "")                           # "" = load the model in-process; "http://host:port" or "unix:///path.sock"
+EMBEDDING_SERVER_WAIT = float(os.getenv("EMBEDDING_SERVER_WAIT", "300"))       # seconds to wait for the server to come up
+EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "300"))  # per request; a full first-run encode is one request
+ENCODE_BATCH_MAX = int(os.getenv("ENCODE_BATCH_MAX", "32"))                     # most texts per coalesced forward pass
+ENCODE_BATCH_WAIT_MS = float(os.getenv("ENCODE_BATCH_WAIT_MS", "3"))            # how long the first query waits for company
+
+log = logging.info
+
+
+BACKENDS = ("torch", "onnx", "int8")
+
+
+def model_key(model_name, backend=ENCODER_BACKEND):
+    """Name vectors are cached and served under; each backend's vectors differ slightly."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown ENCODER_BACKEND {backend!r}, expected one of {', '.join(BACKENDS)}")
+    if backend == "torch":
+        return model_name  # caches written before backends existed stay valid
+    if backend == "onnx" and ENCODER_ONNX_FILE:
+        return f"{model_name}@onnx-{os.path.splitext(os.path.basename(ENCODER_ONNX_FILE))[0]}"
+    return f"{model_name}@{backend}"
+
+
+def load_model(model_name, backend=ENCODER_BACKEND):
+    """A local SentenceTransformer for `model_name` running on `backend`.
+
+    onnx needs sentence-transformers>=3.2 with optimum[onnxruntime] and exports the
+    model on first use unless the repo ships ENCODER_ONNX_FILE; int8 quantizes the
+    torch model's Linear layers at load time and needs nothing extra.
+    """
+    from sentence_transformers import SentenceTransformer
+    model_key(model_name, backend)  # validates the backend name
+    started = time.monotonic()
+    if backend == "onnx":
+        model_kwargs = {"file_name": ENCODER_ONNX_FILE} if ENCODER_ONNX_FILE else None
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+    elif backend == "int8":
+        import torch
+        model = SentenceTransformer(model_name, device="cpu")
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        model = SentenceTransformer(model_name)
+    log(f"🧠 Loaded {model_name} ({backend}) in {time.monotonic() - started:.1f}s")
+    return model
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class RemoteEncoder:
+    """Stand-in for SentenceTransformer that encodes through embedding_server.py.
+
+    Only encode() is provided, with the arguments the apps use. Each thread keeps
+    its own keep-alive connection; vectors come back as raw float32 bytes.
+    """
+
+    def __init__(self, url, model_name, timeout=EMBEDDING_SERVER_TIMEOUT):
+        self.url = url
+        self.model_name = model_name
+        self.timeout = timeout
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            self._connect = lambda: _UnixHTTPConnection(parsed.path, timeout)
+        else:
+            self._connect = lambda: http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+        self._local = threading.local()
+
+    def _post(self, path, payload):
+        body = json.dumps(payload).encode("utf-8")
+        deadline = time.monotonic() + EMBEDDING_SERVER_WAIT
+        while True:
+            conn = getattr(self._local, "conn", None) or self._connect()
+            self._local.conn = conn
+            try:
+                conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+                res = conn.getresponse()
+                data = res.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                self._local.conn = None
+                if time.monotonic() > deadline:
+                    raise
+                log(f"⏳ Waiting for embedding server at {self.url} ({e})")
+                time.sleep(2)
+                continue
+            if res.status != 200:
+                raise RuntimeError(f"Embedding server returned {res.status}: {data[:200].decode('utf-8', 'replace')}")
+            return res, data
+
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        res, data = self._post("/encode", {
+            "model": self.model_name,
+            "texts": texts,
+            "normalize": bool(normalize_embeddings),
+        })
+        dim = int(res.getheader("X-Embedding-Dim"))
+        return np.frombuffer(data, dtype=np.float32).reshape(len(texts), dim).copy()
+
+
+class _PendingEncode:
+    __slots__ = ("texts", "normalize", "kwargs", "enqueued", "done", "result", "error")
+
+    def __init__(self, texts, normalize, kwargs):
+        self.texts = texts
+        self.normalize = normalize
+        self.kwargs = kwargs  # other encode() arguments, e.g. batch_size; only equal ones share a forward pass
+        self.enqueued = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchingEncoder:
+    """Coalesces concurrent encode() calls into one forward pass.
+
+    The first queued call waits up to ENCODE_BATCH_WAIT_MS for others, or until
+    ENCODE_BATCH_MAX texts are queued; one thread runs the batch and hands each
+    caller its rows; calls with different encode() arguments run as separate passes.
+    Calls with ENCODE_BATCH_MAX texts or more go straight to the model. Either way
+    only one forward pass runs at a time.
+    """
+
+    def __init__(self, encoder, max_batch=ENCODE_BATCH_MAX, max_wait_ms=ENCODE_BATCH_WAIT_MS):
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = []
+        self._queued_texts = 0
+        self._cond = threading.Condition()
+        self._model_lock = threading.Lock()
+        self.batches = self.batched_texts = self.direct_calls = self.max_batch_seen = self.max_queue_depth = 0
+        self.queue_wait_seconds = 0.0
+        self._start_worker()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_worker(self):
+        self._thread = threading.Thread(target=self._run, name="batching-encoder", daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        self._queue = []
+        self._queued_texts = 0
+        self._cond = threading.Condition()
+        self._model_lock = threading.Lock()
+        self._start_worker()
+
+    def _encode(self, texts, normalize, **kwargs):
+        with self._model_lock:
+            return np.asarray(self.encoder.encode(texts, normalize_embeddings=normalize, **kwargs), dtype=np.float32)
+
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        if len(texts) >= self.max_batch:
+            self.direct_calls += 1
+            vecs = self._encode(texts, normalize_embeddings, **kwargs)
+        else:
+            item = _PendingEncode(texts, bool(normalize_embeddings), kwargs)
+            with self._cond:
+                self._queue.append(item)
+                self._queued_texts += len(texts)
+                self.max_queue_depth = max(self.max_queue_depth, self._queued_texts)
+                self._cond.notify()
+            item.done.wait()
+            if item.error is not None:
+                raise item.error
+            vecs = item.result
+        return vecs[0] if single else vecs
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0].enqueued + self.max_wait
+            while self._queued_texts < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, n_texts = [], 0
+            while self._queue and (not batch or n_texts + len(self._queue[0].texts) <= self.max_batch):
+                item = self._queue.pop(0)
+                batch.append(item)
+                n_texts += len(item.texts)
+            self._queued_texts -= n_texts
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            started = time.monotonic()
+            groups = {}
+            for item in batch:
+                groups.setdefault((item.normalize, tuple(sorted(item.kwargs.items()))), []).append(item)
+            for (normalize, kwargs), items in groups.items():
+                try:
+                    vecs = self._encode([t for item in items for t in item.texts], normalize, **dict(kwargs))
+                except Exception as e:
+                    for item in items:
+                        item.error = e
+                        item.done.set()
+                    continue
+                offset = 0
+                for item in items:
+                    item.result = vecs[offset:offset + len(item.texts)]
+                    offset += len(item.texts)
+                    item.done.set()
+            n_texts = sum(len(item.texts) for item in batch)
+            self.batches += 1
+            self.batched_texts += n_texts
+            self.max_batch_seen = max(self.max_batch_seen, n_texts)
+            self.queue_wait_seconds += sum(started - item.enqueued for item in batch)
+
+    def stats(self):
+        with self._cond:
+            queue_depth = self._queued_texts
+        return {
+            "queue_depth": queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "batched_texts": self.batched_texts,
+            "mean_batch_size": self.batched_texts / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "mean_queue_wait_ms": 1000 * self.queue_wait_seconds / self.batched_texts if self.batched_texts else 0.0,
+            "direct_calls": self.direct_calls,
+        }
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def load_encoder(model_name, backend=ENCODER_BACKEND):
+    """The encoder for `model_name` on `backend`, shared by everything in this process.
+
+    With EMBEDDING_SERVER set this is a RemoteEncoder and the model (and torch) is
+    never loaded here; the server must run the same backend. Otherwise one local
+    model per (model name, backend).
+    """
+    with _encoders_lock:
+        if (model_name, backend) not in _encoders:
+            if EMBEDDING_SERVER:
+                log(f"🔌 Using embedding server {EMBEDDING_SERVER} for {model_key(model_name, backend)}")
+                _encoders[model_name, backend] = RemoteEncoder(EMBEDDING_SERVER, model_key(model_name, backend))
+            else:
+                _encoders[model_name, backend] = load_model(model_name, backend)
+        return _encoders[model_name, backend]
@@ -1,13 +1,14 @@
 import os
-import requests
 import pandas as pd
 import logging
 import json
-from urllib.parse import quote
+import argparse
 from datetime import datetime
 from dotenv import load_dotenv
 from datetime import timezone
-from pytz import timezone as pytz_timezone
+from dataset_store import DatasetStore
+from airtable_client import AirtableClient, AirtableError
+from lookup_cache import LookupCache, lookup_mappings
 
 load_dotenv()
 
@@ -18,9 +19,10 @@ TABLE_IDS = {
     "project_list": "tbl47jwAiaLqdD7H6",
     "main_content": "tblEZLLELhP9q5QLH"
 }
-CSV_PATH = os.getenv("CSV_PATH", "dataset_client.csv") # change path here
-
-HEADERS = {"Authorization": f"Bearer {API_TOKEN}"}
+CSV_PATH = os.getenv("CSV_PATH", "dataset_client.csv") # legacy dataset, imported into DATASET_DIR on first run
+DATASET_DIR = os.getenv("DATASET_DIR", "dataset_client") # change path here
+LAST_SYNC_FILE = os.getenv("LAST_SYNC_FILE", "last_updated_time_client.json")
+SYNC_BATCH_RECORDS = int(os.getenv("SYNC_BATCH_RECORDS", "5000"))  # records per dataset write (and cursor checkpoint) during a sync
 
 logging.basicConfig(
     level=logging.INFO,
@@ -33,45 +35,65 @@ logging.basicConfig(
 )
 log = logging.info
 
+dataset_store = DatasetStore(DATASET_DIR, key="Keyword Name", csv_path=CSV_PATH)
+airtable = AirtableClient(API_TOKEN, BASE_ID)
+seo_lookup = LookupCache(airtable, TABLE_IDS["seo_team"], field="Name")
+project_lookup = LookupCache(airtable, TABLE_IDS["project_list"], field="Project")
+
 def fetch_all_records(table_id, label=""):
     log(f"🔄 Fetching records from {label} (ID: {table_id[:6]}***) ...")
-    url = f"https://api.airtable.com/v0/{BASE_ID}/{quote(table_id)}"
-    all_records = []
-    offset = None
-    while True:
-        params = {"offset": offset} if offset else {}
-        res = requests.get(url, headers=HEADERS, params=params)
-        if res.status_code != 200:
-            log(f"❌ Failed to fetch {label}: {res.text}")
-            return []
-        data = res.json()
-        all_records.extend(data.get("records", []))
-        offset = data.get("offset")
-        if not offset:
-            break
+    all_records = airtable.list_records(table_id)
     log(f"✅ Fetched {len(all_records)} records from {label}")
     return all_records
 
-def append_to_csv(updated_records):
+def load_sync_state():
+    if os.path.exists(LAST_SYNC_FILE):
+        with open(LAST_SYNC_FILE, "r") as f:
+            return json.load(f)
+    return {"last_sync": None}
+
+def save_sync_state(state):
+    tmp_path = LAST_SYNC_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, LAST_SYNC_FILE)
+
+def record_fields(r):
+    # API records carry {"id", "fields"}; webhook records arrive flattened
+    return r["fields"] if "fields" in r else {k: v for k, v in r.items() if k != "id"}
+
+def current_record_ids():
+    """Airtable record id behind each Keyword Name currently in the dataset."""
+    if not dataset_store.exists():
+        return pd.Series(dtype=object)
+    table = dataset_store.read_table(columns=["Keyword Name", "record_id"])
+    if "Keyword Name" not in table.column_names:
+        return pd.Series(dtype=object)
+    names = table.column("Keyword Name").to_pandas()
+    ids = table.column("record_id").to_pandas() if "record_id" in table.column_names else pd.Series(None, index=names.index, dtype=object)
+    owners = pd.Series(ids.to_numpy(), index=names.to_numpy())
+    return owners[owners.index.notna()]
+
+def append_to_dataset(updated_records):
     if not updated_records:
         log("ℹ️ No records to update.")
         return
 
-    seo_records = fetch_all_records(TABLE_IDS["seo_team"], "SEO Team")
-    project_records = fetch_all_records(TABLE_IDS["project_list"], "Project List")
     main_records = updated_records if updated_records else fetch_all_records(TABLE_IDS["main_content"], "Main Content")
 
     log(f"🔍 DEBUG: Processing {len(main_records)} main records")
-    
-    seo_map = {r["id"]: r["fields"].get("Name", f"Unknown ({r['id']})") for r in seo_records}
-    project_map = {r["id"]: r["fields"].get("Project", f"Unknown ({r['id']})") for r in project_records}
+
+    # Cached SEO Team / Project List maps, refreshed in parallel: no table scans per webhook, unknown ids are fetched one by one
+    seo_ids = {sid for r in main_records for sid in record_fields(r).get("SEO", [])}
+    project_ids = {pid for r in main_records for pid in record_fields(r).get("Project", [])}
+    seo_map, project_map = lookup_mappings((seo_lookup, seo_ids), (project_lookup, project_ids))
 
     log(f"🔍 DEBUG: SEO map has {len(seo_map)} entries")
     log(f"🔍 DEBUG: Project map has {len(project_map)} entries")
 
     enriched_rows = []
     for i, r in enumerate(main_records):
-        f = r.get("fields", {})
+        f = record_fields(r)
 
         needed_fields = [
             "Keyword", "Keyword Name", "url", "Month", "SEO", "Project",
@@ -91,6 +113,7 @@ def append_to_csv(updated_records):
         project_names = [project_map.get(pid, f"Unknown ({pid})") for pid in project_ids]
         f["SEO Name"] = ", ".join(seo_names)
         f["Project Name"] = ", ".join(project_names)
+        f["record_id"] = r["id"]
         enriched_rows.append(f)
 
     log(f"🔍 DEBUG: Created {len(enriched_rows)} enriched rows")
@@ -163,48 +186,103 @@ def append_to_csv(updated_records):
     all_cols = cols_to_front + [c for c in df_cleaned.columns if c not in cols_to_front]
     df_cleaned = df_cleaned[all_cols]
 
-    if os.path.exists(CSV_PATH):
-        existing_df = pd.read_csv(CSV_PATH, dtype=str)
-        log(f"🔍 DEBUG: Existing CSV has {len(existing_df)} rows")
-        combined_df = pd.concat([existing_df, df_cleaned], ignore_index=True)
-        combined_df.drop_duplicates(subset=["Keyword Name"], keep="last", inplace=True)
-        log(f"🔍 DEBUG: After combining and deduplicating: {len(combined_df)} rows")
+    # Only this batch is written; earlier rows with the same Keyword Name are superseded on read.
+    # Rows a record no longer produces (renamed keyword, no longer On Page) are removed by the next sync.
+    version = dataset_store.append(df_cleaned)
+    log(f"✅ Updated {DATASET_DIR} with {len(df_cleaned)} records (version {version})")
+
+def produced_keyword_name(fields):
+    """Keyword Name of the row a record writes, as split_keyword does; None if it writes none."""
+    if not fields.get("Keyword") or fields.get("Content Type", "On Page") != "On Page":
+        return None
+    return str(fields["Keyword"]).split('-', 1)[-1].strip()
+
+def delete_removed_records(full):
+    """Delete rows whose Airtable record is gone or now writes another Keyword Name.
+
+    A full sync also drops rows written before record ids were kept.
+    """
+    log("🔎 Checking for deleted records...")
+    live = {r["id"]: produced_keyword_name(r.get("fields", {}))
+            for r in airtable.list_records(TABLE_IDS["main_content"], **{"fields[]": ["Keyword", "Content Type"]})}
+    owners = current_record_ids()
+    gone = owners.isna() if full else pd.Series(False, index=owners.index)
+    gone |= owners.notna() & ~owners.isin(live.keys())
+    stale = owners.isin(live.keys()) & (owners.map(live).to_numpy() != owners.index.to_numpy())
+    keys = owners.index[(gone | stale).to_numpy()].tolist()
+    if keys:
+        dataset_store.delete(keys)
+    log(f"🗑️ Removed {gone.sum()} rows for deleted records, {stale.sum()} stale rows ({len(live)} live records)")
+
+def sync_main_content(full=False, check_deletes=True):
+    """Pull Main Content records modified since the last sync (or all of them) into the dataset.
+
+    Progress is checkpointed in LAST_SYNC_FILE every SYNC_BATCH_RECORDS records, so an
+    interrupted run resumes from its last page instead of starting over.
+    """
+    state = load_sync_state()
+    run = state.get("pending")
+    if run is None or (full and not run["full"]):
+        full = full or not state.get("last_sync") or not dataset_store.exists()
+        run = {
+            "full": full,
+            "since": None if full else state["last_sync"],
+            "started": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "offset": None,
+        }
     else:
-        combined_df = df_cleaned
-        log(f"🔍 DEBUG: Creating new CSV with {len(combined_df)} rows")
+        log(f"⏯️ Resuming interrupted sync started at {run['started']}")
 
-    # Final check before saving
-    # for test_kw in ['แจ้งความออนไลน์', 'โอซาก้า ที่เที่ยว']:
-    #     final_matches = combined_df[combined_df['Keyword Name'].astype(str).str.contains(test_kw, na=False)]
-    #     log(f"🔍 DEBUG: FINAL CSV will contain {len(final_matches)} records with '{test_kw}'")
+    params = {"pageSize": 100}
+    if run["since"]:
+        params["filterByFormula"] = f"IS_AFTER(LAST_MODIFIED_TIME(), '{run['since']}')"
+        log(f"🕒 Incremental sync of records modified after {run['since']}")
+    else:
+        log("🆕 Full sync of Main Content")
+
+    def checkpoint(batch, offset):
+        append_to_dataset(batch)
+        run["offset"] = offset
+        save_sync_state({"last_sync": state.get("last_sync"), "pending": run})
+
+    fetched = 0
+    batch = []
+    try:
+        for page, offset in airtable.iter_pages(TABLE_IDS["main_content"], offset=run["offset"], **params):
+            batch.extend(page)
+            fetched += len(page)
+            if len(batch) >= SYNC_BATCH_RECORDS:
+                checkpoint(batch, offset)
+                batch = []
+    except AirtableError as e:
+        if e.status != 422 or not run["offset"]:
+            raise
+        # Airtable offsets expire; rows already written are simply overwritten again
+        log("⚠️ Saved offset expired, restarting the listing from the first page")
+        run["offset"] = None
+        save_sync_state({"last_sync": state.get("last_sync"), "pending": run})
+        return sync_main_content(full=run["full"], check_deletes=check_deletes)
+    if batch:
+        checkpoint(batch, None)
+    log(f"✅ Fetched {fetched} changed records from Main Content")
 
-    combined_df.to_csv(CSV_PATH, index=False)
-    log(f"✅ Updated {CSV_PATH} with {len(df_cleaned)} records (total: {len(combined_df)})")
+    if check_deletes:
+        delete_removed_records(run["full"])
+
+    save_sync_state({"last_sync": run["started"]})
+    log(f"📌 Sync time updated to: {run['started']}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the client Main Content table into the dataset")
+    parser.add_argument("--full", action="store_true", help="re-read every record instead of only those modified since the last sync")
+    parser.add_argument("--skip-deletes", action="store_true", help="do not list record ids to detect deleted records and stale rows")
+    args = parser.parse_args()
     try:
         if not API_TOKEN or not BASE_ID:
             log("❌ Missing environment variables")
             exit(1)
-        log("🚀 Starting Airtable sync") 
-
-        # Check Thailand time (UTC+7)
-        thailand = pytz_timezone('Asia/Bangkok')
-        now_th = datetime.now(thailand)
-
-        need_to_download = False
-
-        if os.path.exists(CSV_PATH) and False:
-            log("🗑️ Dataset exists. Deleting and re-downloading.")
-            os.remove(CSV_PATH)
-            need_to_download = True
-        else:
-            log("📂 Dataset not found. Will download it now.")
-            need_to_download = True
-
-        if need_to_download and False:
-            main_records = fetch_all_records(TABLE_IDS["main_content"], "Main Content")
-            append_to_csv(main_records)
+        log("🚀 Starting Airtable sync")
+        sync_main_content(full=args.full, check_deletes=not args.skip_deletes)
 
     except Exception as e:
         log(f"❌ Exception during sync: {e}")
@@ -1,10 +1,11 @@
 import os
-import requests
 import pandas as pd
 import logging
 import json
-from urllib.parse import quote
 from dotenv import load_dotenv
+from dataset_store import DatasetStore
+from airtable_client import AirtableClient
+from lookup_cache import LookupCache, lookup_mappings
 
 # Load environment variables
 load_dotenv()
@@ -16,9 +17,9 @@ MAIN_TABLE = os.getenv("AIRTABLE_TABLE_NAME_PBN")
 WEBSITE_TABLE = "Website"
 CATEGORY_TABLE = "Categories"
 LAST_SYNC_FILE = "last_updated_time_pbn.json"
-CSV_PATH = "dataset_pbn.csv"
-
-HEADERS = {"Authorization": f"Bearer {API_TOKEN}"}
+CSV_PATH = "dataset_pbn.csv"  # legacy dataset, imported into DATASET_DIR on first run
+DATASET_DIR = "dataset_pbn"
+DATASET_COLUMNS = ["record_id", "Main Keyword", "🔗 Keyword Link", "Categories", "Website", "Last Modified"]
 
 # Logging setup
 logging.basicConfig(
@@ -32,6 +33,11 @@ logging.basicConfig(
 )
 log = logging.info
 
+dataset_store = DatasetStore(DATASET_DIR, key="record_id", csv_path=CSV_PATH)
+airtable = AirtableClient(API_TOKEN, BASE_ID)
+website_lookup = LookupCache(airtable, WEBSITE_TABLE)
+category_lookup = LookupCache(airtable, CATEGORY_TABLE)
+
 # 🔒 Helper to mask sensitive IDs
 def mask_id(value, visible=6):
     if not value or len(value) <= visible:
@@ -51,48 +57,21 @@ def save_last_sync_time(timestamp):
 
 def fetch_all_records(table_name, modified_after=None):
     log(f"📥 Fetching records from table: {mask_id(table_name)}...")
-    url = f"https://api.airtable.com/v0/{BASE_ID}/{quote(table_name)}"
-    records = []
-    offset = None
-
-    while True:
-        params = {"pageSize": 100}
-        if offset:
-            params["offset"] = offset
-        if modified_after and table_name == MAIN_TABLE:
-            params["filterByFormula"] = f"IS_AFTER({{Last Modified}}, '{modified_after}')"
-
-        response = requests.get(url, headers=HEADERS, params=params)
-        if response.status_code != 200:
-            log(f"❌ Error fetching from {table_name}: {response.text}")
-            return []
-
-        data = response.json()
-        records.extend(data.get("records", []))
-        offset = data.get("offset")
-
-        if not offset:
-            break
+    params = {"pageSize": 100}
+    if modified_after and table_name == MAIN_TABLE:
+        params["filterByFormula"] = f"IS_AFTER({{Last Modified}}, '{modified_after}')"
 
+    records = airtable.list_records(table_name, **params)
     log(f"✅ Fetched {len(records)} records from {mask_id(table_name)}")
     return records
 
-def detect_field_name(records, table_name):
-    if not records:
-        raise ValueError(f"❌ No records found in {table_name} table.")
-    first_fields = list(records[0]["fields"].keys())
-    if not first_fields:
-        raise ValueError(f"❌ No fields found in the first record of {table_name} table.")
-    return first_fields[0]  # Use the only or first field
-
-def build_id_to_name_map(table_name):
-    records = fetch_all_records(table_name)
-    field_name = detect_field_name(records, table_name)
-    log(f"✅ Detected field for {table_name}: {field_name}")
-    return {
-        rec["id"]: rec["fields"].get(field_name, f"Unknown ({rec['id']})")
-        for rec in records
-    }
+def linked_ids(records, field):
+    ids = set()
+    for r in records:
+        value = r.get("fields", {}).get(field, [])
+        if isinstance(value, list):
+            ids.update(value)
+    return ids
 
 def map_main_records(records, website_map, category_map):
     mapped = []
@@ -119,35 +98,18 @@ def map_main_records(records, website_map, category_map):
 
     return mapped
 
-def append_to_csv(updated_records):
+def append_to_dataset(updated_records):
     if not updated_records:
         log("ℹ️ No records to update.")
-        if not os.path.exists(CSV_PATH):
-            empty_df = pd.DataFrame(columns=["record_id", "Main Keyword", "🔗 Keyword Link", "Categories", "Website", "Last Modified"])
-            empty_df.to_csv(CSV_PATH, index=False)
-            log("📄 Created empty dataset.csv with headers.")
+        if not dataset_store.exists():
+            dataset_store.ensure(DATASET_COLUMNS)
+            log("📄 Created empty dataset with headers.")
         return
 
+    # Only the updated rows are written; rows with the same record_id are superseded on read
     new_df = pd.DataFrame(updated_records)
-    record_id_col = "record_id"
-
-    # Load existing dataset
-    if os.path.exists(CSV_PATH):
-        existing_df = pd.read_csv(CSV_PATH, dtype=str)
-        before_len = len(existing_df)
-
-        if record_id_col not in existing_df.columns:
-            raise ValueError(f"❌ '{record_id_col}' column missing in existing CSV.")
-
-        existing_df = existing_df[~existing_df[record_id_col].isin(new_df[record_id_col])]
-        dropped = before_len - len(existing_df)
-        log(f"🗑️ Removed {dropped} duplicate records based on '{record_id_col}'")
-    else:
-        existing_df = pd.DataFrame()
-
-    combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-    combined_df.to_csv(CSV_PATH, index=False)
-    log(f"✅ Updated dataset.csv with {len(new_df)} new/updated records (total rows now: {len(combined_df)})")
+    version = dataset_store.append(new_df)
+    log(f"✅ Updated dataset with {len(new_df)} new/updated records (version {version})")
 
 if __name__ == "__main__":
     try:
@@ -160,21 +122,23 @@ if __name__ == "__main__":
             exit(1)
 
         log("🚀 Starting Airtable sync process")
-        full_fetch = not os.path.exists(CSV_PATH)
-
-        website_map = build_id_to_name_map(WEBSITE_TABLE)
-        category_map = build_id_to_name_map(CATEGORY_TABLE)
+        full_fetch = not dataset_store.exists()
 
         if full_fetch:
-            log("🆕 No dataset.csv found. Doing full sync...")
+            log("🆕 No dataset found. Doing full sync...")
             all_records = fetch_all_records(MAIN_TABLE)
         else:
             last_sync = load_last_sync_time()
             log(f"🕒 Last sync time: {last_sync}")
             all_records = fetch_all_records(MAIN_TABLE, modified_after=last_sync)
 
+        # Cached Website/Categories maps, refreshed in parallel; only ids the cache has not seen yet are fetched
+        website_map, category_map = lookup_mappings(
+            (website_lookup, linked_ids(all_records, "Website")),
+            (category_lookup, linked_ids(all_records, "Categories")),
+        )
         mapped_records = map_main_records(all_records, website_map, category_map)
-        append_to_csv(mapped_records)
+        append_to_dataset(mapped_records)
 
         if mapped_records:
             latest_modified = max(r.get("Last Modified", load_last_sync_time()) for r in mapped_records)
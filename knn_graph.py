@@ -0,0 +1,214 @@
+import os
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+KNN_GRAPH = os.getenv("KNN_GRAPH", "1") != "0"                       # serve client searches from the precomputed graph
+KNN_GRAPH_MAX_ROWS = int(os.getenv("KNN_GRAPH_MAX_ROWS", "20000"))  # larger partitions are scored per search instead
+KNN_GRAPH_MAX_SEO_ROWS = int(os.getenv("KNN_GRAPH_MAX_SEO_ROWS", "5000"))  # the same for app_client's SEO-wide (SEO, "") partitions
+KNN_GRAPH_BLOCK = int(os.getenv("KNN_GRAPH_BLOCK", "256"))          # query rows per matrix product while building
+KNN_DELTA_MAX = float(os.getenv("KNN_DELTA_MAX", "0.25"))           # changed share of a partition above which it is rebuilt whole
+
+log = logging.info
+
+
+def first_occurrences(names):
+    # A search starts from the first row of its keyword, so only those rows get a neighbour list
+    return ~pd.Index(names).duplicated()
+
+
+def occurrence_keys(names):
+    # (text, n-th occurrence) per row: identifies a row across reloads, where positions shift
+    counts = {}
+    keys = []
+    for name in names:
+        n = counts.get(name, 0)
+        counts[name] = n + 1
+        keys.append((name, n))
+    return keys
+
+
+class PartitionGraph:
+    """Neighbour lists of one partition in CSR form, over partition-local row offsets.
+
+    Row i's answers are neighbors[indptr[i]:indptr[i + 1]] with their scores, best
+    first. `names` holds each row's keyword and tells a later reload what changed.
+    """
+
+    __slots__ = ("names", "indptr", "neighbors", "scores")
+
+    def __init__(self, names, indptr, neighbors, scores):
+        self.names = names
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.scores = scores
+
+    @classmethod
+    def from_lists(cls, names, lists):
+        lengths = np.array([len(rows) for rows, _ in lists], dtype=np.int64)
+        indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        empty = np.empty(0)
+        neighbors = np.concatenate([rows for rows, _ in lists] or [empty]).astype(np.int32)
+        scores = np.concatenate([scores for _, scores in lists] or [empty]).astype(np.float32)
+        return cls(names, indptr, neighbors, scores)
+
+    def lookup(self, local):
+        start, stop = self.indptr[local], self.indptr[local + 1]
+        return self.neighbors[start:stop], self.scores[start:stop]
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.neighbors.nbytes + self.scores.nbytes
+
+
+def build_partition(names, neighbours, block=KNN_GRAPH_BLOCK):
+    """Full build: `neighbours(locals)` returns (local rows, scores) for each query row, best first."""
+    empty = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+    lists = [empty] * len(names)
+    queries = np.flatnonzero(first_occurrences(names))
+    for start in range(0, len(queries), block):
+        for local, answer in zip(queries[start:start + block], neighbours(queries[start:start + block])):
+            lists[local] = answer
+    return PartitionGraph.from_lists(names, lists), len(queries)
+
+
+def update_partition(old, names, neighbours, pair_scores, k, min_score, block=KNN_GRAPH_BLOCK):
+    """Delta build from the previous graph of the same partition; None when a full build is cheaper.
+
+    Rows are matched across the reload by (keyword, occurrence). A list that held a
+    removed row is recomputed; every other list only has to consider the added rows,
+    scored with `pair_scores(query locals, candidate locals)`, against what it had.
+    Lists are best first, at most `k` long and above `min_score`, as `neighbours` builds them.
+    """
+    new_index = {key: i for i, key in enumerate(occurrence_keys(names))}
+    old_to_new = np.array([new_index.get(key, -1) for key in occurrence_keys(old.names)], dtype=np.int64)
+    new_to_old = np.full(len(names), -1, dtype=np.int64)
+    new_to_old[old_to_new[old_to_new >= 0]] = np.flatnonzero(old_to_new >= 0)
+    added = np.flatnonzero(new_to_old < 0)
+    removed = old_to_new < 0
+    if len(added) + removed.sum() > KNN_DELTA_MAX * max(len(names), 1):
+        return None, 0
+
+    old_first = first_occurrences(old.names)
+    queries = np.flatnonzero(first_occurrences(names))
+    recompute, merge = [], []
+    for local in queries:
+        was = new_to_old[local]
+        if was < 0 or not old_first[was] or removed[old.lookup(was)[0]].any():
+            recompute.append(local)
+        else:
+            merge.append(local)
+
+    empty = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+    lists = [empty] * len(names)
+    for start in range(0, len(recompute), block):
+        for local, answer in zip(recompute[start:start + block], neighbours(np.array(recompute[start:start + block]))):
+            lists[local] = answer
+    for start in range(0, len(merge), block):
+        merge_block = np.array(merge[start:start + block], dtype=np.int64)
+        added_scores = pair_scores(merge_block, added) if len(added) else np.empty((len(merge_block), 0), dtype=np.float32)
+        for j, local in enumerate(merge_block):
+            old_rows, old_scores = old.lookup(new_to_old[local])
+            fresh = names[added] != names[local]  # never the input keyword itself
+            rows = np.concatenate([old_to_new[old_rows], added[fresh]])
+            scores = np.concatenate([old_scores, added_scores[j][fresh]])
+            keep = scores >= min_score
+            rows, scores = rows[keep], scores[keep]
+            order = np.argsort(rows, kind="stable")                      # ties go to the earlier row, like top_k
+            order = order[np.argsort(-scores[order], kind="stable")][:k]
+            lists[local] = (rows[order], scores[order])
+    return PartitionGraph.from_lists(names, lists), len(recompute)
+
+
+class KnnGraph:
+    """Precomputed answers of every graphed partition of one snapshot; never mutated."""
+
+    def __init__(self, partitions):
+        self.partitions = partitions
+
+    def lookup(self, key, rows, input_row):
+        """(output rows, scores) for a search of `input_row`'s keyword in partition `key`, or None if not graphed."""
+        graph = self.partitions.get(key)
+        if graph is None:
+            return None
+        local_rows, scores = graph.lookup(input_row - rows.start)
+        return local_rows.astype(np.int64) + rows.start, scores
+
+    @property
+    def nbytes(self):
+        return sum(graph.nbytes for graph in self.partitions.values())
+
+
+def build_graph(partitions, names, neighbours, pair_scores, k, min_score, previous=None, max_rows=KNN_GRAPH_MAX_ROWS):
+    """Graph of every partition up to `max_rows` rows, reusing `previous` where it still holds.
+
+    `neighbours(key, rows, locals)` and `pair_scores(key, rows, query locals, candidate
+    locals)` score within the partition `key`, whose rows are the slice `rows`.
+    Unchanged partitions are shared as they are, slightly changed ones are patched
+    (update_partition), the rest built in full.
+    """
+    started = time.monotonic()
+    graphs = {}
+    reused = patched = rebuilt = computed = 0
+    for key, rows in partitions.items():
+        if rows.stop - rows.start > max_rows:
+            continue
+        part_names = names[rows]
+        old = previous.partitions.get(key) if previous is not None else None
+        if old is not None and np.array_equal(old.names, part_names):
+            graphs[key] = old
+            reused += 1
+            continue
+        graph = None
+        if old is not None:
+            graph, n = update_partition(old, part_names, lambda q, key=key, rows=rows: neighbours(key, rows, q),
+                                        lambda q, c, key=key, rows=rows: pair_scores(key, rows, q, c), k, min_score)
+            patched += graph is not None
+        if graph is None:
+            graph, n = build_partition(part_names, lambda q, key=key, rows=rows: neighbours(key, rows, q))
+            rebuilt += 1
+        graphs[key] = graph
+        computed += n
+    graph = KnnGraph(graphs)
+    log(f"🕸️ kNN graph: {len(graphs)} partitions ({reused} reused, {patched} patched, {rebuilt} built), "
+        f"{computed} lists computed, {graph.nbytes / 1e6:.1f} MB in {time.monotonic() - started:.2f}s")
+    return graph
+
+
+def graph_arrays(graph):
+    """A graph as flat arrays for publishing: (index, {"indptr", "neighbors", "scores"}).
+
+    Each index entry is [key, indptr offset, indptr length, edge offset, edge count];
+    graph_from_arrays() turns the arrays (e.g. memory-mapped) back into a graph.
+    """
+    index, indptr, neighbors, scores = [], [], [], []
+    n_ptr = n_edges = 0
+    for key, part in graph.partitions.items():
+        index.append([list(key), n_ptr, len(part.indptr), n_edges, len(part.neighbors)])
+        indptr.append(part.indptr)
+        neighbors.append(part.neighbors)
+        scores.append(part.scores)
+        n_ptr += len(part.indptr)
+        n_edges += len(part.neighbors)
+    return index, {
+        "indptr": np.concatenate(indptr or [np.empty(0)]).astype(np.int64),
+        "neighbors": np.concatenate(neighbors or [np.empty(0)]).astype(np.int32),
+        "scores": np.concatenate(scores or [np.empty(0)]).astype(np.float32),
+    }
+
+
+def graph_from_arrays(index, arrays, names, partitions):
+    # Views into the published arrays, no copies; row names come from the snapshot's own DataFrame
+    graphs = {}
+    for key, ptr_start, ptr_len, edge_start, n_edges in index:
+        key = tuple(key)
+        graphs[key] = PartitionGraph(
+            names[partitions[key]],
+            arrays["indptr"][ptr_start:ptr_start + ptr_len],
+            arrays["neighbors"][edge_start:edge_start + n_edges],
+            arrays["scores"][edge_start:edge_start + n_edges],
+        )
+    return KnnGraph(graphs)
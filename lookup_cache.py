@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from airtable_client import AirtableError
+
+LOOKUP_CACHE_DIR = os.getenv("LOOKUP_CACHE_DIR", "lookup_cache")
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "3600"))                  # seconds before a map is refreshed
+LOOKUP_CACHE_FULL_REFRESH = float(os.getenv("LOOKUP_CACHE_FULL_REFRESH", "86400"))  # seconds between full re-reads
+
+log = logging.info
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class LookupCache:
+    """id -> name map of a small Airtable lookup table (SEO Team, Project List, Website, ...).
+
+    The map lives in memory and in a JSON file under LOOKUP_CACHE_DIR, so webhook
+    enrichment and cron runs share it. Once LOOKUP_CACHE_TTL has passed only records
+    modified since the last refresh are fetched (and only the name field); a full
+    re-read runs every LOOKUP_CACHE_FULL_REFRESH to drop deleted records. Ids that are
+    still unknown are fetched one record at a time.
+    """
+
+    def __init__(self, client, table, field=None, ttl=LOOKUP_CACHE_TTL, cache_dir=LOOKUP_CACHE_DIR):
+        self.client = client
+        self.table = table
+        self.field = field  # None: use the first field of the first record
+        self.ttl = ttl
+        self.path = os.path.join(cache_dir, f"{quote(client.base_id or '', safe='')}-{quote(table, safe='')}.json")
+        self.names = {}
+        self.refreshed_at = 0.0
+        self.full_refreshed_at = 0.0
+        self.since = None
+        self._file_mtime = None
+        self._missing = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    # ---------- disk ----------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            mtime = os.path.getmtime(self.path)
+        except (OSError, ValueError) as e:
+            log(f"⚠️ Ignoring unreadable lookup cache {self.path}: {e}")
+            return
+        if self.field is not None and data.get("field") != self.field:
+            return
+        self.field = data["field"]
+        self.names = data["names"]
+        self.refreshed_at = data["refreshed_at"]
+        self.full_refreshed_at = data["full_refreshed_at"]
+        self.since = data["since"]
+        self._file_mtime = mtime
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "table": self.table,
+                "field": self.field,
+                "names": self.names,
+                "refreshed_at": self.refreshed_at,
+                "full_refreshed_at": self.full_refreshed_at,
+                "since": self.since,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._file_mtime = os.path.getmtime(self.path)
+
+    # ---------- refresh ----------
+
+    def _name(self, rec):
+        return rec.get("fields", {}).get(self.field, f"Unknown ({rec['id']})")
+
+    def _refresh(self):
+        now, since = time.time(), _utc_now()
+        full = self.field is None or self.since is None or now - self.full_refreshed_at >= LOOKUP_CACHE_FULL_REFRESH
+        if full:
+            records = self.client.list_records(self.table)
+            if self.field is None:
+                if not records or not records[0].get("fields"):
+                    raise ValueError(f"❌ No records found in {self.table} table.")
+                self.field = next(iter(records[0]["fields"]))
+                log(f"✅ Detected field for {self.table}: {self.field}")
+            self.names = {rec["id"]: self._name(rec) for rec in records}
+            self.full_refreshed_at = now
+        else:
+            records = self.client.list_records(
+                self.table,
+                **{"fields[]": [self.field], "filterByFormula": f"IS_AFTER(LAST_MODIFIED_TIME(), '{self.since}')"},
+            )
+            self.names.update((rec["id"], self._name(rec)) for rec in records)
+        self.refreshed_at = now
+        self.since = since
+        self._missing.clear()
+        self._save()
+        log(f"🗂️ {'Reloaded' if full else 'Refreshed'} lookup {self.table}: {len(records)} records fetched, {len(self.names)} cached")
+
+    def _fetch_missing(self, ids):
+        now = time.time()
+        fetched = 0
+        for record_id in ids:
+            if now - self._missing.get(record_id, 0) < self.ttl:
+                continue  # looked up recently and not found
+            try:
+                rec = self.client.get_record(self.table, record_id)
+            except AirtableError as e:
+                log(f"⚠️ Could not fetch {self.table} record {record_id}: {e}")
+                self._missing[record_id] = now
+                continue
+            self.names[rec["id"]] = self._name(rec)
+            fetched += 1
+        if fetched:
+            self._save()
+
+    def mapping(self, ids=()):
+        """Current id -> name map, refreshed when stale; unknown ids in `ids` are fetched first."""
+        with self._lock:
+            if os.path.exists(self.path) and os.path.getmtime(self.path) != self._file_mtime:
+                self._load()  # another process refreshed it
+            if time.time() - self.refreshed_at >= self.ttl:
+                self._refresh()
+            missing = {i for i in ids if i not in self.names}
+            if missing:
+                self._fetch_missing(missing)
+            return dict(self.names)
+
+    def invalidate(self):
+        with self._lock:
+            self.refreshed_at = 0.0
+
+
+def lookup_mappings(*requests):
+    """mapping(ids) of several independent caches at once; takes (cache, ids) pairs, returns their maps in order."""
+    with ThreadPoolExecutor(max_workers=len(requests) or 1) as pool:
+        futures = [pool.submit(cache.mapping, ids) for cache, ids in requests]
+        return [future.result() for future in futures]
@@ -0,0 +1,216 @@
+import os
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+
+METRICS_LOG_SAMPLE = float(os.getenv("METRICS_LOG_SAMPLE", "0"))  # fraction of searches whose timings and details are logged
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+log = logging.info
+
+
+def sampled():
+    """Whether this request logs its detail lines: always at DEBUG level, else METRICS_LOG_SAMPLE of them."""
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        return True
+    return METRICS_LOG_SAMPLE > 0 and random.random() < METRICS_LOG_SAMPLE
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    out.append((f"{self.name}_bucket", key + (_number(bound),), count))
+                out.append((f"{self.name}_sum", key, total))
+                out.append((f"{self.name}_count", key, counts[-1]))
+        return out
+
+
+class _Callback(_Metric):
+    # Read at scrape time from state the app already keeps (queue depth, cache hits, ...)
+    def __init__(self, name, help, kind, fn):
+        super().__init__(name, help)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        return [(self.name, (), self.fn())]
+
+
+class Registry:
+    """Metrics of one app, rendered in the Prometheus text format.
+
+    Every sample carries the registry's constant labels (e.g. app="pbn"). Each
+    process keeps its own numbers; `peers`, if set, returns other processes'
+    families() to render alongside them (serve.py's workers).
+    """
+
+    def __init__(self, prefix, **const_labels):
+        self.prefix = prefix
+        self.const_names = tuple(const_labels)
+        self.const_values = tuple(str(v) for v in const_labels.values())
+        self.metrics = []
+        self.peers = None
+
+    def set_label(self, name, value):
+        """Add or change a constant label, e.g. worker="1" in a pre-fork worker."""
+        labels = dict(zip(self.const_names, self.const_values))
+        labels[name] = str(value)
+        self.const_names, self.const_values = tuple(labels), tuple(labels.values())
+
+    def _add(self, metric):
+        metric.name = f"{self.prefix}_{metric.name}"
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge_fn(self, name, help, fn):
+        return self._add(_Callback(name, help, "gauge", fn))
+
+    def counter_fn(self, name, help, fn):
+        return self._add(_Callback(name, help, "counter", fn))
+
+    def families(self):
+        """[name, kind, help, [[sample name, [[label, value], ...], value], ...]] per metric; JSON-safe."""
+        out = []
+        for metric in self.metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:  # one broken callback must not hide the rest
+                logging.warning(f"⚠️ Metric {metric.name} failed: {e}")
+                continue
+            names = self.const_names + metric.labelnames + (("le",) if metric.kind == "histogram" else ())
+            rows = []
+            for sample_name, key, value in samples:
+                sample_names = names if sample_name.endswith("_bucket") else names[:len(self.const_names) + len(metric.labelnames)]
+                rows.append([sample_name, [list(pair) for pair in zip(sample_names, self.const_values + key)], value])
+            out.append([metric.name, metric.kind, metric.help, rows])
+        return out
+
+    def render(self):
+        families = self.families()
+        if self.peers is not None:
+            by_name = {family[0]: family[3] for family in families}
+            for name, kind, help, samples in self.peers():
+                if name in by_name:
+                    by_name[name].extend(samples)
+                else:
+                    by_name[name] = samples
+                    families.append([name, kind, help, samples])
+        lines = []
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_labels([n for n, _ in labels], [v for _, v in labels])} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Wall time of each stage of one request; finish() records them in `histogram`.
+
+    Stages may be entered more than once (per query block); their times add up.
+    With `sampled` set, finish() also logs one line with every stage.
+    """
+
+    def __init__(self, histogram, sampled=False):
+        self.histogram = histogram
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def finish(self, label=""):
+        total = time.perf_counter() - self.started
+        for name, seconds in self.stages.items():
+            self.histogram.observe(seconds, stage=name)
+        self.histogram.observe(total, stage="total")
+        if self.sampled:
+            detail = ", ".join(f"{name} {1000 * seconds:.1f}" for name, seconds in self.stages.items())
+            log(f"⏱️ {label} {1000 * total:.1f}ms ({detail})")
+        return total
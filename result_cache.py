@@ -0,0 +1,63 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "20000"))  # per-keyword search results kept per process, 0 disables
+
+
+class ResultCache:
+    """Bounded in-process LRU of per-keyword search results.
+
+    Keys start with the dataset version, so after a reload older entries are never
+    hit again and simply age out. Cached results are shared: callers must not mutate them.
+    """
+
+    def __init__(self, capacity=RESULT_CACHE_SIZE):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "capacity": self.capacity,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def search_etag(*parts):
+    """ETag of a search response, derived from what determines it rather than from the body.
+
+    Pass the settings that shape results, the dataset version and the request inputs;
+    a match can then be answered with 304 before any work is done.
+    """
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=12).hexdigest()
@@ -0,0 +1,358 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import logging
+import argparse
+import importlib
+import threading
+import traceback
+
+import numpy as np
+import pandas as pd
+from werkzeug.serving import make_server
+
+from vector_search import CompactVectors
+from knn_graph import graph_arrays
+
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", str(os.cpu_count() or 1)))
+SERVE_TORCH_THREADS = int(os.getenv("SERVE_TORCH_THREADS", "1"))        # intra-op threads per worker for query encoding
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "1.0"))  # how often the parent checks the dataset version
+SERVE_METRICS_SECONDS = float(os.getenv("SERVE_METRICS_SECONDS", "5"))    # how often each process shares its metrics with the others
+CURRENT_FILE = "current.json"
+METRICS_PREFIX = "metrics-"  # metrics-<worker>.json next to the snapshots, see SharedMetrics
+
+log = logging.info
+
+
+def publish_snapshot(path, df, vecs, version, graph=None):
+    """Write the serving DataFrame, vectors and kNN graph (if any) of `version`.
+
+    Returns what load_published() returns: the vectors memory-mapped, then the graph's
+    arrays if one was written. Every worker maps the same files, so vectors and graph
+    sit once in the page cache however many workers there are and no worker rebuilds
+    the graph. The previous generation is kept for workers still switching. Publishing
+    the current version again (once its graph is in) only writes the graph.
+    """
+    os.makedirs(path, exist_ok=True)
+    current_path = os.path.join(path, CURRENT_FILE)
+    previous = None
+    if os.path.exists(current_path):
+        with open(current_path, "r") as f:
+            previous = json.load(f)
+    frame_file, vectors_file = f"frame-{version}.pkl", f"vectors-{version}.npy"
+    arrays = {}
+    if previous and previous["version"] == version:
+        frame_file, vectors_file, scales_file = previous["frame"], previous["vectors"], previous.get("scales")
+    else:
+        df.to_pickle(os.path.join(path, frame_file + ".tmp"), compression=None)
+        os.replace(os.path.join(path, frame_file + ".tmp"), os.path.join(path, frame_file))
+        arrays, scales_file = snapshot_arrays(vecs, version)
+    graph_files = None
+    if graph is not None:
+        index, graph_data = graph_arrays(graph)
+        graph_files = {"index": f"knn-index-{version}.json"}
+        for part, array in graph_data.items():
+            graph_files[part] = f"knn-{part}-{version}.npy"
+            arrays[graph_files[part]] = array
+        with open(os.path.join(path, graph_files["index"] + ".tmp"), "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(os.path.join(path, graph_files["index"] + ".tmp"), os.path.join(path, graph_files["index"]))
+    for name, array in arrays.items():
+        with open(os.path.join(path, name + ".tmp"), "wb") as f:
+            np.save(f, array)
+        os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+
+    current = {"version": version, "frame": frame_file, "vectors": vectors_file, "scales": scales_file, "graph": graph_files}
+    with open(current_path + ".tmp", "w") as f:
+        json.dump(current, f)
+    os.replace(current_path + ".tmp", current_path)
+
+    keep = {CURRENT_FILE} | published_files(current)
+    if previous:
+        keep |= published_files(previous)
+    for name in os.listdir(path):
+        if name not in keep and not name.endswith(".tmp") and not name.startswith(METRICS_PREFIX):
+            os.remove(os.path.join(path, name))  # open maps stay valid after unlink
+    return load_published(path, current)
+
+
+def snapshot_arrays(vecs, version):
+    # ({file name: array}, scales file or None) for the vectors of `version`
+    vectors_file = f"vectors-{version}.npy"
+    if isinstance(vecs, CompactVectors):
+        arrays = {vectors_file: np.ascontiguousarray(vecs.data)}  # float16/int8 stay compact on disk too
+        if vecs.scale is None:
+            return arrays, None
+        scales_file = f"scales-{version}.npy"
+        arrays[scales_file] = np.ascontiguousarray(vecs.scale)
+        return arrays, scales_file
+    return {vectors_file: np.ascontiguousarray(vecs, dtype=np.float32)}, None
+
+
+def published_files(current):
+    return {current["frame"], current["vectors"], current.get("scales"), *(current.get("graph") or {}).values()}
+
+
+def load_snapshot_vectors(path, current):
+    # Memory-mapped vectors of a snapshot, wrapped again when they were published compact
+    vecs = np.load(os.path.join(path, current["vectors"]), mmap_mode="r")
+    if vecs.dtype == np.float32:
+        return vecs
+    scale = np.load(os.path.join(path, current["scales"]), mmap_mode="r") if current.get("scales") else None
+    return CompactVectors(vecs, scale)
+
+
+def load_published(path, current):
+    # (vectors,) or (vectors, (graph index, graph arrays)), all memory-mapped; see knn_graph.graph_from_arrays
+    vecs = load_snapshot_vectors(path, current)
+    graph_files = current.get("graph")
+    if not graph_files:
+        return (vecs,)
+    with open(os.path.join(path, graph_files["index"]), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    arrays = {part: np.load(os.path.join(path, name), mmap_mode="r") for part, name in graph_files.items() if part != "index"}
+    return vecs, (index, arrays)
+
+
+class SnapshotFollower:
+    """Worker side of a pre-fork server: maps the parent's newest snapshot after SIGUSR1.
+
+    A snapshot is new when current.json changed: a newer version, or the same one with its kNN graph.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.current = self._read_current()  # what the parent published before forking this worker
+        self.signaled = False
+        self._lock = threading.Lock()
+        signal.signal(signal.SIGUSR1, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        self.signaled = True
+
+    def _read_current(self):
+        with open(os.path.join(self.path, CURRENT_FILE), "r") as f:
+            return json.load(f)
+
+    def poll(self, apply):
+        """Map a newer snapshot once and hand it to `apply(df, vectors, version[, graph])`; True if it did.
+
+        Called by the app's snapshot watcher. The graph is there when the parent published one;
+        the app then maps it instead of building its own. A failed load or apply is retried on
+        the watcher's next tick.
+        """
+        if not self.signaled:
+            return False
+        with self._lock:
+            if not self.signaled:
+                return False  # another thread is already switching
+            self.signaled = False  # cleared before reading, so a signal for an even newer version is not lost
+            try:
+                current = self._read_current()
+                if current == self.current:
+                    return False
+                df = pd.read_pickle(os.path.join(self.path, current["frame"]), compression=None)
+                vecs, *graph = load_published(self.path, current)
+                apply(df, vecs, current["version"], *graph)
+            except Exception:
+                self.signaled = True
+                raise
+            self.current = current
+            return True
+
+
+class SharedMetrics:
+    """Lets whichever worker a scrape reaches answer /metrics for every process.
+
+    Each process labels its samples worker="<slot>" (the parent, which reloads, is
+    worker="parent") and writes them every SERVE_METRICS_SECONDS; /metrics renders
+    its own live numbers plus the others' last written ones.
+    """
+
+    def __init__(self, path, registry, worker, lock=None):
+        self.path = path
+        self.file = f"{METRICS_PREFIX}{worker}.json"
+        self.registry = registry
+        self.lock = lock or threading.Lock()
+        registry.set_label("worker", worker)
+        registry.peers = self.peers
+
+    def start(self):
+        threading.Thread(target=self._run, name="shared-metrics", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.write()
+            except Exception as e:
+                log(f"❌ Writing metrics failed: {e}")
+            time.sleep(SERVE_METRICS_SECONDS)
+
+    def write(self):
+        with self.lock:
+            families = self.registry.families()
+        tmp_path = os.path.join(self.path, self.file + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(families, f, default=float)
+        os.replace(tmp_path, os.path.join(self.path, self.file))
+
+    def peers(self):
+        families = []
+        for name in sorted(os.listdir(self.path)):
+            if name.startswith(METRICS_PREFIX) and name.endswith(".json") and name != self.file:
+                try:
+                    with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+                        families.extend(json.load(f))
+                except (OSError, ValueError):
+                    continue  # removed since listdir
+        return families
+
+
+class PreforkServer:
+    """Loads an app module once, then serves it from `workers` forked processes.
+
+    The parent owns the model, the embedding cache and reloads: it polls the dataset
+    version, re-encodes what changed, publishes a snapshot and signals every worker
+    with SIGUSR1. Workers share the listening socket and never encode keywords; their
+    snapshot watcher maps the new snapshot in the background. Until the app has warmed
+    up, the parent itself answers on the socket (/healthz, /readyz, 503s).
+
+    SEARCH_ENGINE=faiss is not supported: FAISS indexes cannot be memory-mapped from
+    the published snapshot, so every worker would sync its own copy on each reload.
+    """
+
+    def __init__(self, app_name, host, port, workers):
+        if os.getenv("SEARCH_ENGINE") == "faiss":
+            logging.warning("⚠️ SEARCH_ENGINE=faiss is not supported under serve.py, using brute force")
+            os.environ["SEARCH_ENGINE"] = "brute"  # read when the app imports ann_index, just below
+        self.module = importlib.import_module(app_name)  # model, dataset and embeddings load here, once, in the background
+        self.module.snapshot_watcher.stop()  # the parent refreshes from watch(), so it can publish each snapshot
+        self.host, self.port, self.n_workers = host, port, workers
+        self.snapshot_dir = os.path.join(SNAPSHOT_DIR, app_name)
+        self.workers = {}  # pid -> slot, the worker label of its metrics
+        self.stopping = False
+        self._reload_lock = threading.Lock()  # fork() never happens in the middle of a reload
+
+    def publish(self):
+        snap = self.module.snapshot
+        # Swapped for the memory-mapped copy, which forked workers share (the client's kNN graph too)
+        vecs, *graph = publish_snapshot(self.snapshot_dir, snap.df, snap.keyword_vecs, snap.version, getattr(snap, "graph", None))
+        self.module.apply_snapshot(snap.df, vecs, snap.version, *graph)
+
+    def spawn(self, slot):
+        with self._reload_lock:
+            # SIGUSR1 stays blocked until the child has installed its handler
+            signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+            pid = os.fork()
+            if pid == 0:
+                self.run_worker(slot)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGUSR1})
+            self.workers[pid] = slot
+
+    def run_worker(self, slot):
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            torch = sys.modules.get("torch")
+            if torch is not None:
+                torch.set_num_threads(SERVE_TORCH_THREADS)
+            self.module.snapshot_follower = SnapshotFollower(self.snapshot_dir)
+            SharedMetrics(self.snapshot_dir, self.module.registry, slot).start()
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGUSR1})
+            self.module.snapshot_watcher.start()
+            server = make_server(self.host, self.port, self.module.app, threaded=True, fd=self.sock.fileno())
+            log(f"👷 Worker {os.getpid()} serving snapshot version {self.module.snapshot.version}")
+            server.serve_forever()
+        except Exception:
+            log(traceback.format_exc())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def watch(self):
+        while not self.stopping:
+            time.sleep(SNAPSHOT_POLL_SECONDS)
+            try:
+                with self._reload_lock:
+                    if not self.module.snapshot_watcher.check():
+                        continue
+                    self.publish()
+                    for pid in list(self.workers):
+                        os.kill(pid, signal.SIGUSR1)
+                log(f"📣 Published snapshot version {self.module.snapshot.version} to {len(self.workers)} workers")
+            except Exception as e:
+                log(f"❌ Snapshot reload failed: {e}")
+                log(traceback.format_exc())
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def serve_while_warming(self):
+        # Workers are forked from a warm parent so they share its model; until then the parent answers probes itself
+        warmup = self.module.warmup
+        if warmup.ready.is_set():
+            return
+        server = make_server(self.host, self.port, self.module.app, threaded=True, fd=self.sock.fileno())
+        threading.Thread(target=server.serve_forever, name="warmup-server", daemon=True).start()
+        log(f"⏳ {self.module.__name__} warming up, answering on {self.host}:{self.port} meanwhile")
+        warmup.wait()
+        server.shutdown()
+        server.server_close()  # closes the server's duplicate; the listening socket stays open for the workers
+
+    def run(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(1024)
+        self.sock.set_inheritable(True)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        for name in os.listdir(self.snapshot_dir):
+            if name.startswith(METRICS_PREFIX):
+                os.remove(os.path.join(self.snapshot_dir, name))  # from a previous run, maybe with more workers
+        # Under the reload lock, so no worker is forked while this holds a metric's lock
+        SharedMetrics(self.snapshot_dir, self.module.registry, "parent", self._reload_lock).start()
+        self.serve_while_warming()
+        self.publish()
+
+        for slot in range(self.n_workers):
+            self.spawn(slot)
+        log(f"🚀 Serving {self.module.__name__} on {self.host}:{self.port} with {self.n_workers} workers")
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        threading.Thread(target=self.watch, name="snapshot-watcher", daemon=True).start()
+
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = self.workers.pop(pid, None)
+            if not self.stopping and slot is not None:
+                log(f"⚠️ Worker {pid} exited ({status}), starting a new one")
+                time.sleep(1)
+                self.spawn(slot)
+        self.module.webhook_queue.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve app_pbn or app_client from pre-forked workers")
+    parser.add_argument("app", choices=["app_pbn", "app_client"])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, help="default: 5003 for app_pbn, 5004 for app_client")
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    args = parser.parse_args()
+
+    port = args.port or {"app_pbn": 5003, "app_client": 5004}[args.app]
+    PreforkServer(args.app, args.host, port, args.workers).run()
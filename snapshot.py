@@ -0,0 +1,129 @@
+import os
+import time
+import logging
+import threading
+import traceback
+
+SNAPSHOT_WATCH_SECONDS = float(os.getenv("SNAPSHOT_WATCH_SECONDS", "1.0"))  # how often the watcher checks for a newer dataset
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "30"))      # wait before retrying a failed warm-up step
+
+log = logging.info
+
+
+class SnapshotWatcher:
+    """Keeps an app's search snapshot fresh from a background thread.
+
+    `refresh()` builds a complete new snapshot when the dataset changed and swaps
+    it in with a single assignment, returning True if it did. It runs every
+    SNAPSHOT_WATCH_SECONDS, or right away after wake(), so requests never wait on
+    a reload; they keep reading the snapshot they started with. A failed refresh
+    leaves the current snapshot serving and is retried on the next tick.
+    """
+
+    def __init__(self, refresh, interval=SNAPSHOT_WATCH_SECONDS):
+        self.refresh = refresh
+        self.interval = interval
+        self.running = False
+        self.refreshes = self.failures = 0
+        self._wake = threading.Event()
+        self._lock = threading.Lock()  # one refresh at a time, whoever calls it
+        self._thread = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="snapshot-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread, e.g. when serve.py drives check() itself."""
+        self.running = False
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _after_fork(self):
+        # Threads do not survive fork(); a pre-fork worker that was watching gets its own thread
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        if self.running:
+            self.running = False
+            self.start()
+
+    def wake(self):
+        """Check now instead of at the next tick, e.g. after a webhook batch was written."""
+        self._wake.set()
+
+    def check(self):
+        """Refresh on the caller's thread; True if a new snapshot was swapped in."""
+        with self._lock:
+            swapped = self.refresh()
+        if swapped:
+            self.refreshes += 1
+        return swapped
+
+    def _run(self):
+        while self.running:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if not self.running:
+                break
+            try:
+                self.check()
+            except Exception as e:
+                self.failures += 1
+                log(f"❌ Snapshot refresh failed, still serving the previous one: {e}")
+                log(traceback.format_exc())
+
+
+class Warmup:
+    """Loads an app in the background so it can bind its port right away.
+
+    `steps` are (stage, fn) pairs run in order on a daemon thread; `stage` names the
+    one in progress for /readyz. A failing step is logged and retried after
+    WARMUP_RETRY_SECONDS, so a model download hiccup does not kill the process.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.stage = "starting"
+        self.error = None
+        self.ready = threading.Event()
+        self.started = time.monotonic()
+        self.seconds = None
+
+    def start(self):
+        threading.Thread(target=self._run, name="warmup", daemon=True).start()
+
+    def _run(self):
+        for stage, fn in self.steps:
+            self.stage = stage
+            while True:
+                try:
+                    fn()
+                    self.error = None
+                    break
+                except Exception as e:
+                    self.error = str(e)
+                    log(f"❌ Warm-up failed while {stage}, retrying in {WARMUP_RETRY_SECONDS:.0f}s: {e}")
+                    log(traceback.format_exc())
+                    time.sleep(WARMUP_RETRY_SECONDS)
+        self.stage = "ready"
+        self.seconds = time.monotonic() - self.started
+        self.ready.set()
+        log(f"✅ Ready after {self.seconds:.1f}s")
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
+
+    def status(self):
+        return {
+            "ready": self.ready.is_set(),
+            "stage": self.stage,
+            "error": self.error,
+            "seconds": self.seconds if self.seconds is not None else time.monotonic() - self.started,
+        }
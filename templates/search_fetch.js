@@ -0,0 +1,19 @@
+// Search responses carry an ETag: a repeated search sends If-None-Match and a 304 reuses the stored body
+const searchCache = new Map();
+async function searchFetch(url, payload) {
+  const body = JSON.stringify(payload);
+  const cached = searchCache.get(body);
+  const headers = { "Content-Type": "application/json" };
+  if (cached) headers["If-None-Match"] = cached.etag;
+  const response = await fetch(url, { method: "POST", headers, body });
+  if (response.status === 304 && cached) {
+    return new Response(cached.text, { status: 200, headers: { "Content-Type": "application/json" } });
+  }
+  const etag = response.headers.get("ETag");
+  if (response.ok && etag) {
+    searchCache.delete(body);
+    searchCache.set(body, { etag, text: await response.clone().text() });
+    if (searchCache.size > 200) searchCache.delete(searchCache.keys().next().value);
+  }
+  return response;
+}
@@ -0,0 +1,103 @@
+import pytest
+import requests
+
+import airtable_client
+from airtable_client import AirtableClient, AirtableError, TokenBucket
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data or {}
+        self.headers = headers or {}
+        self.text = str(self.data)
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    """Answers requests from a script of responses (or exceptions to raise)."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.calls.append((method, url, kwargs.get("params")))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # A fake clock: sleeping returns at once but moves monotonic() forward
+    now, slept = [100.0], []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(airtable_client.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(airtable_client.time, "sleep", sleep)
+    return slept
+
+
+def client_with(responses, base_id, max_retries=3):
+    client = AirtableClient("token", base_id, api_url="http://airtable.test/v0", rate=1000, max_retries=max_retries)
+    client.session = FakeSession(responses)
+    return client
+
+
+def test_retries_5xx_and_connection_errors(sleeps):
+    client = client_with([FakeResponse(503), requests.ConnectionError("reset"), FakeResponse(200, {"id": "rec1"})], "appRetry")
+    assert client.get_record("Main Content", "rec1") == {"id": "rec1"}
+    assert len(client.session.calls) == 3
+    assert len(sleeps) == 2
+    assert client.session.calls[0][1] == "http://airtable.test/v0/appRetry/Main%20Content/rec1"
+
+
+def test_429_honours_retry_after_through_the_bucket(sleeps):
+    client = client_with([FakeResponse(429, headers={"Retry-After": "2"}), FakeResponse(200, {"records": []})], "appLimited")
+    assert client.list_records("Projects") == []
+    # the penalty is waited out by the next acquire(), not by a sleep in request()
+    assert sleeps == [pytest.approx(2 + 1 / 1000)]
+
+
+def test_gives_up_after_max_retries(sleeps):
+    client = client_with([FakeResponse(500)] * 3, "appDown", max_retries=2)
+    with pytest.raises(AirtableError) as e:
+        client.get_record("Projects", "rec1")
+    assert e.value.status == 500
+    assert len(client.session.calls) == 3
+
+
+def test_other_errors_are_not_retried(sleeps):
+    client = client_with([FakeResponse(404)], "appMissing")
+    with pytest.raises(AirtableError) as e:
+        client.get_record("Projects", "recMissing")
+    assert e.value.status == 404
+    assert sleeps == []
+
+
+def test_list_records_follows_offsets(sleeps):
+    client = client_with([
+        FakeResponse(200, {"records": [{"id": "rec1"}], "offset": "page2"}),
+        FakeResponse(200, {"records": [{"id": "rec2"}]}),
+    ], "appPages")
+    assert client.list_records("Projects", pageSize=1) == [{"id": "rec1"}, {"id": "rec2"}]
+    assert [params for _, _, params in client.session.calls] == [{"pageSize": 1}, {"pageSize": 1, "offset": "page2"}]
+
+
+def test_token_bucket_limits_the_rate(sleeps):
+    bucket = TokenBucket(rate=5)
+    for _ in range(5):
+        bucket.acquire()
+    assert sleeps == []  # a full bucket's burst
+    bucket.acquire()
+    assert sleeps == [pytest.approx(0.2)]
+    bucket.penalize(1.0)
+    bucket.acquire()
+    assert sum(sleeps) == pytest.approx(0.2 + 1.2)
@@ -0,0 +1,81 @@
+import threading
+
+import numpy as np
+
+from encoders import BatchingEncoder
+
+
+class FakeModel:
+    """Row i of a result is [len(text), normalize, batch_size]; every call is recorded."""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+
+    def encode(self, texts, normalize_embeddings=False, batch_size=32):
+        self.calls.append((list(texts), normalize_embeddings, batch_size))
+        if self.fail_on in texts:
+            raise RuntimeError("model failed")
+        return np.array([[len(t), normalize_embeddings, batch_size] for t in texts], dtype=np.float32)
+
+
+def encode_together(encoder, calls):
+    # Every call queued from its own thread; max_batch equals their total texts, so they share one batch
+    results = [None] * len(calls)
+
+    def run(i, texts, kwargs):
+        try:
+            results[i] = encoder.encode(texts, **kwargs)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i, texts, kwargs)) for i, (texts, kwargs) in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def test_calls_with_equal_arguments_share_a_pass():
+    model = FakeModel()
+    encoder = BatchingEncoder(model, max_batch=4, max_wait_ms=10000)
+    results = encode_together(encoder, [(["a", "bb"], {}), (["ccc"], {}), (["dddd"], {})])
+    assert len(model.calls) == 1
+    assert sorted(model.calls[0][0]) == ["a", "bb", "ccc", "dddd"]
+    assert [r[:, 0].tolist() for r in results] == [[1, 2], [3], [4]]
+    assert encoder.batches == 1 and encoder.batched_texts == 4
+
+
+def test_calls_are_grouped_by_arguments():
+    model = FakeModel()
+    encoder = BatchingEncoder(model, max_batch=5, max_wait_ms=10000)
+    results = encode_together(encoder, [
+        (["a"], {"normalize_embeddings": True}),
+        (["bb"], {"normalize_embeddings": True}),
+        (["ccc"], {}),
+        (["dddd"], {"batch_size": 8}),
+        (["eeeee"], {"normalize_embeddings": True, "batch_size": 8}),
+    ])
+    assert sorted((sorted(texts), normalize, batch_size) for texts, normalize, batch_size in model.calls) == [
+        (["a", "bb"], True, 32), (["ccc"], False, 32), (["dddd"], False, 8), (["eeeee"], True, 8),
+    ]
+    assert [r.tolist() for r in results] == [[[1, 1, 32]], [[2, 1, 32]], [[3, 0, 32]], [[4, 0, 8]], [[5, 1, 8]]]
+    assert encoder.batches == 1
+
+
+def test_a_failing_group_only_fails_its_callers():
+    model = FakeModel(fail_on="boom")
+    encoder = BatchingEncoder(model, max_batch=3, max_wait_ms=10000)
+    results = encode_together(encoder, [(["boom"], {}), (["ok"], {"batch_size": 8}), (["fine"], {"batch_size": 8})])
+    assert isinstance(results[0], RuntimeError)
+    assert [r[:, 0].tolist() for r in results[1:]] == [[2], [4]]
+
+
+def test_large_and_single_calls():
+    model = FakeModel()
+    encoder = BatchingEncoder(model, max_batch=2, max_wait_ms=0)
+    assert encoder.encode(["a", "bb", "ccc"], batch_size=16)[:, 2].tolist() == [16, 16, 16]
+    assert encoder.direct_calls == 1
+    assert encoder.encode("dddd").tolist() == [4, 0, 32]
+    assert encoder.encode([]).shape == (0, 0)
@@ -0,0 +1,63 @@
+import os
+
+import pandas as pd
+
+import dataset_store
+from dataset_store import DatasetStore
+
+KEY = "record_id"
+
+
+def rows(store):
+    df = store.read()
+    return {record: keyword for record, keyword in zip(df[KEY], df["Keyword Name"])}
+
+
+def test_append_replaces_rows_with_the_same_key(tmp_path):
+    store = DatasetStore(str(tmp_path), KEY)
+    v1 = store.append(pd.DataFrame({KEY: ["rec1", "rec2"], "Keyword Name": ["a", "b"]}))
+    v2 = store.append(pd.DataFrame({KEY: ["rec2", "rec3"], "Keyword Name": ["b2", "c"]}))
+    assert v2 > v1 == 1
+    assert store.version() == v2
+    assert rows(store) == {"rec1": "a", "rec2": "b2", "rec3": "c"}
+
+
+def test_delete_and_reappend(tmp_path):
+    store = DatasetStore(str(tmp_path), KEY)
+    store.append(pd.DataFrame({KEY: ["rec1", "rec2"], "Keyword Name": ["a", "b"]}))
+    store.delete(["rec1", None])
+    assert rows(store) == {"rec2": "b"}
+    assert "__deleted__" not in store.read().columns
+    store.append(pd.DataFrame({KEY: ["rec1"], "Keyword Name": ["a2"]}))
+    assert rows(store) == {"rec1": "a2", "rec2": "b"}
+
+
+def test_compact_keeps_the_same_rows(tmp_path):
+    store = DatasetStore(str(tmp_path), KEY)
+    store.append(pd.DataFrame({KEY: ["rec1", "rec2", "rec3"], "Keyword Name": ["a", "b", "c"]}))
+    last = store.append(pd.DataFrame({KEY: ["rec2"], "Keyword Name": ["b2"]}), delete=["rec3"])
+    before = store.read()
+    version = store.compact()
+
+    assert version == last + 1 == store.version()
+    assert sorted(os.listdir(tmp_path)) == [".lock", f"base-{version}.parquet", "manifest.json"]
+    pd.testing.assert_frame_equal(store.read(), before)
+
+
+def test_compacts_after_enough_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_store, "DATASET_COMPACT_SEGMENTS", 3)
+    store = DatasetStore(str(tmp_path), KEY)
+    for i in range(3):
+        store.append(pd.DataFrame({KEY: [f"rec{i}"], "Keyword Name": [str(i)]}))
+    assert store._read_manifest()["segments"] == []
+    assert rows(store) == {"rec0": "0", "rec1": "1", "rec2": "2"}
+
+
+def test_empty_cells_read_back_as_nan(tmp_path):
+    csv_path = tmp_path / "dataset.csv"
+    pd.DataFrame({KEY: ["rec1", "rec2"], "Keyword Name": ["a", ""], "Month": ["Jan", None]}).to_csv(csv_path, index=False)
+    store = DatasetStore(str(tmp_path / "store"), KEY, csv_path=str(csv_path))
+    df = store.read()
+    assert df["Keyword Name"].isna().tolist() == [False, True]
+    assert df["Month"].isna().tolist() == [False, True]
+    assert store.read_table(columns=["Month"]).column_names == [KEY, "Month"]
@@ -0,0 +1,123 @@
+import numpy as np
+
+from knn_graph import KnnGraph, build_graph, build_partition, graph_arrays, graph_from_arrays, update_partition
+
+K, MIN_SCORE = 4, 0.0
+
+
+def scorer(vecs, names):
+    # Exact neighbours as the client app selects them: other keywords only, above MIN_SCORE, best first, ties by row
+    def neighbours(locals_):
+        answers = []
+        for q in locals_:
+            scores = vecs @ vecs[q]
+            rows = np.flatnonzero((names != names[q]) & (scores >= MIN_SCORE))
+            rows = rows[np.argsort(-scores[rows], kind="stable")][:K]
+            answers.append((rows.astype(np.int32), scores[rows].astype(np.float32)))
+        return answers
+
+    def pair_scores(query_locals, cand_locals):
+        return vecs[query_locals] @ vecs[cand_locals].T
+
+    return neighbours, pair_scores
+
+
+def keyword_vectors(names, dim=8):
+    # One fixed vector per keyword text, so a keyword scores the same before and after a reload
+    vecs = []
+    for name in names:
+        rng = np.random.default_rng(sum(ord(c) for c in name))
+        vec = rng.standard_normal(dim)
+        vecs.append(vec / np.linalg.norm(vec))
+    return np.array(vecs, dtype=np.float32)
+
+
+def assert_same_graph(a, b):
+    assert np.array_equal(a.indptr, b.indptr)
+    assert np.array_equal(a.neighbors, b.neighbors)
+    np.testing.assert_allclose(a.scores, b.scores, rtol=1e-6)
+
+
+def test_update_matches_full_build():
+    old_names = np.array([f"kw{i}" for i in range(40)] + ["kw3", "kw7"], dtype=object)
+    old_vecs = keyword_vectors(old_names)
+    old, _ = build_partition(old_names, scorer(old_vecs, old_names)[0], block=16)
+
+    # kw5 and one copy of kw7 removed, two new keywords and a third kw3 added
+    new_names = np.array([n for i, n in enumerate(old_names) if i not in (5, 41)] + ["new a", "kw3", "new b"], dtype=object)
+    new_vecs = keyword_vectors(new_names)
+    neighbours, pair_scores = scorer(new_vecs, new_names)
+    patched, recomputed = update_partition(old, new_names, neighbours, pair_scores, K, MIN_SCORE, block=16)
+    full, n = build_partition(new_names, neighbours, block=16)
+
+    assert patched is not None
+    assert 0 < recomputed < n
+    assert_same_graph(patched, full)
+
+
+def test_update_gives_up_on_large_changes():
+    old_names = np.array([f"kw{i}" for i in range(10)], dtype=object)
+    old, _ = build_partition(old_names, scorer(keyword_vectors(old_names), old_names)[0])
+    new_names = np.array([f"other{i}" for i in range(10)], dtype=object)
+    neighbours, pair_scores = scorer(keyword_vectors(new_names), new_names)
+    assert update_partition(old, new_names, neighbours, pair_scores, K, MIN_SCORE) == (None, 0)
+
+
+def test_duplicate_rows_only_list_the_first():
+    names = np.array(["a", "b", "a", "c"], dtype=object)
+    graph, n = build_partition(names, scorer(keyword_vectors(names), names)[0])
+    assert n == 3
+    assert len(graph.lookup(2)[0]) == 0
+    assert "a" not in set(names[graph.lookup(0)[0]])
+
+
+def build_two_partitions(names, max_rows=100):
+    vecs = keyword_vectors(names)
+    partitions = {("seo", "p1"): slice(0, 6), ("seo", "p2"): slice(6, 10), ("seo", ""): slice(0, 10)}
+
+    def neighbours(key, rows, locals_):
+        return scorer(vecs[rows], names[rows])[0](locals_)
+
+    def pair_scores(key, rows, query_locals, cand_locals):
+        return scorer(vecs[rows], names[rows])[1](query_locals, cand_locals)
+
+    return partitions, lambda previous=None: build_graph(partitions, names, neighbours, pair_scores, K, MIN_SCORE, previous, max_rows)
+
+
+def test_build_graph_reuses_and_skips_partitions():
+    names = np.array([f"kw{i}" for i in range(10)], dtype=object)
+    partitions, build = build_two_partitions(names, max_rows=6)
+    graph = build()
+    assert set(graph.partitions) == {("seo", "p1"), ("seo", "p2")}  # ("seo", "") is over max_rows
+    again = build(graph)
+    assert all(again.partitions[key] is graph.partitions[key] for key in graph.partitions)
+
+    rows, scores = graph.lookup(("seo", "p2"), partitions[("seo", "p2")], 7)
+    assert rows.min() >= 6 and 7 not in rows
+    assert list(scores) == sorted(scores, reverse=True)
+    assert graph.lookup(("seo", ""), partitions[("seo", "")], 7) is None
+
+
+def test_arrays_round_trip():
+    names = np.array([f"kw{i}" for i in range(10)], dtype=object)
+    partitions, build = build_two_partitions(names)
+    graph = build()
+    index, arrays = graph_arrays(graph)
+    loaded = graph_from_arrays(index, arrays, names, partitions)
+
+    assert isinstance(loaded, KnnGraph)
+    assert set(loaded.partitions) == set(graph.partitions)
+    assert loaded.nbytes == graph.nbytes
+    for key, part in graph.partitions.items():
+        assert_same_graph(loaded.partitions[key], part)
+        assert np.array_equal(loaded.partitions[key].names, part.names)
+    for row in range(10):
+        a = graph.lookup(("seo", ""), partitions[("seo", "")], row)
+        b = loaded.lookup(("seo", ""), partitions[("seo", "")], row)
+        assert np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
+
+
+def test_empty_graph_round_trip():
+    index, arrays = graph_arrays(KnnGraph({}))
+    assert index == [] and all(len(array) == 0 for array in arrays.values())
+    assert graph_from_arrays(index, arrays, np.array([], dtype=object), {}).partitions == {}
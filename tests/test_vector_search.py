@@ -0,0 +1,44 @@
+import numpy as np
+
+from vector_search import top_k
+
+
+def full_sort(scores, k, min_score=None, max_score=None):
+    mask = np.ones(len(scores), dtype=bool)
+    if min_score is not None:
+        mask &= scores >= min_score
+    if max_score is not None:
+        mask &= scores < max_score
+    candidates = np.flatnonzero(mask)
+    return candidates[np.argsort(-scores[candidates], kind="stable")][:max(k, 0)]
+
+
+def test_top_k_orders_best_first():
+    scores = np.array([0.1, 0.9, 0.5, 0.7], dtype=np.float32)
+    assert top_k(scores, 3).tolist() == [1, 3, 2]
+
+
+def test_top_k_ties_keep_row_order():
+    scores = np.array([0.5, 0.9, 0.5, 0.5, 0.9, 0.5], dtype=np.float32)
+    assert top_k(scores, 4).tolist() == [1, 4, 0, 2]
+    assert top_k(scores, 2).tolist() == [1, 4]
+
+
+def test_top_k_applies_score_range():
+    scores = np.array([0.95, 0.2, 0.6, 0.05, 0.6], dtype=np.float32)
+    assert top_k(scores, 10, min_score=0.1, max_score=0.9).tolist() == [2, 4, 1]
+    assert top_k(scores, 0).tolist() == []
+    assert top_k(np.empty(0, dtype=np.float32), 5).tolist() == []
+
+
+def test_top_k_matches_full_stable_sort():
+    rng = np.random.default_rng(0)
+    for _ in range(2000):
+        n = int(rng.integers(0, 40))
+        scores = (rng.integers(0, 5, n) / 4).astype(np.float32)
+        scores[rng.random(n) < 0.1] = -np.inf
+        k = int(rng.integers(0, 12))
+        min_score = None if rng.random() < 0.5 else 0.25
+        max_score = None if rng.random() < 0.5 else 0.75
+        assert top_k(scores, k, min_score, max_score).tolist() == full_sort(scores, k, min_score, max_score).tolist()
+
@@ -0,0 +1,72 @@
+import threading
+
+import webhook_queue
+from webhook_queue import WebhookQueue
+
+
+def idle_queue(flush_fn, **kwargs):
+    # Never flushes on its own; the tests flush on their thread
+    return WebhookQueue(flush_fn, max_batch=1000, max_wait=3600, **kwargs)
+
+
+def test_latest_payload_per_id_wins():
+    batches = []
+    queue = idle_queue(batches.append)
+    queue.put({"id": "rec1", "fields": {"Keyword Name": "old"}})
+    queue.put({"id": "rec2", "fields": {"Keyword Name": "other"}})
+    assert queue.put({"id": "rec1", "fields": {"Keyword Name": "new"}}) == 2
+    queue.flush()
+
+    assert [[record["fields"]["Keyword Name"] for record in batch] for batch in batches] == [["new", "other"]]
+    stats = queue.stats()
+    assert (stats["received"], stats["coalesced"], stats["flushed_records"], stats["pending"]) == (3, 1, 2, 0)
+
+
+def test_flushes_when_batch_is_full():
+    flushed, done = [], threading.Event()
+    queue = WebhookQueue(flushed.append, on_flushed=done.set, max_batch=2, max_wait=3600)
+    queue.put({"id": "rec1"})
+    queue.put({"id": "rec2"})
+    assert done.wait(5)  # written by the queue's own thread
+    assert flushed == [[{"id": "rec1"}, {"id": "rec2"}]]
+
+
+def test_failed_batch_is_retried_then_dropped(monkeypatch):
+    monkeypatch.setattr(webhook_queue, "WEBHOOK_MAX_ATTEMPTS", 2)
+    calls = []
+
+    def flush_fn(batch):
+        calls.append([record["id"] for record in batch])
+        if batch[0]["id"] == "bad":
+            raise RuntimeError("airtable down")
+
+    queue = idle_queue(flush_fn)
+    queue.put({"id": "bad"})
+    queue.flush()
+    assert queue.stats()["pending"] == 1
+    queue.flush()
+    assert queue.stats()["pending"] == 0
+    assert queue.stats()["dropped"] == 1
+    assert queue.stats()["failures"] == 2
+
+    queue.put({"id": "good"})
+    queue.flush()
+    assert calls == [["bad"], ["bad"], ["good"]]
+    assert queue.stats()["flushed_records"] == 1
+
+
+def test_newer_payload_survives_a_failed_write():
+    attempts = []
+    queue = idle_queue(None)
+
+    def flush_fn(batch):
+        attempts.append(batch[0]["v"])
+        if len(attempts) == 1:
+            queue.put({"id": "rec1", "v": 2})  # arrives while the first write is failing
+            raise RuntimeError("timeout")
+
+    queue.flush_fn = flush_fn
+    queue.put({"id": "rec1", "v": 1})
+    queue.flush()
+    queue.flush()
+    assert attempts == [1, 2]
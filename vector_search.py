@@ -0,0 +1,123 @@
+import os
+
+import numpy as np
+
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32")      # keyword matrix in memory: float32 | float16 | int8
+EMBEDDING_RERANK = int(os.getenv("EMBEDDING_RERANK", "0"))     # best candidates per query re-scored in float32, 0 = off
+DEQUANTIZE_BLOCK_ROWS = 8192                                   # rows widened to float32 at a time while scoring
+
+
+def partition_slices(df, columns):
+    # df must already be sorted by `columns` so every group is one contiguous block of rows
+    return {
+        key: slice(int(rows[0]), int(rows[-1]) + 1)
+        for key, rows in df.groupby(columns, sort=False).indices.items()
+    }
+
+
+def top_k(scores, k, min_score=None, max_score=None):
+    # Positions of the k best scores (optionally within [min_score, max_score)), best first
+    if min_score is not None or max_score is not None:
+        mask = np.ones(len(scores), dtype=bool)
+        if min_score is not None:
+            mask &= scores >= min_score
+        if max_score is not None:
+            mask &= scores < max_score
+        candidates = np.flatnonzero(mask)
+    else:
+        candidates = np.arange(len(scores))
+
+    if k <= 0 or len(candidates) == 0:
+        return candidates[:0]
+    if len(candidates) > k:
+        # Keep every score tied with the k-th so the stable sort below picks the earliest positions, like a full sort
+        kth = np.partition(-scores[candidates], k - 1)[k - 1]
+        candidates = candidates[-scores[candidates] <= kth]
+    return candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+
+
+class CompactVectors:
+    """Normalized row vectors held as float16, or as int8 with one float32 scale per row.
+
+    Indexing returns float32 rows, so code that copies rows (reuse_vectors, the FAISS
+    index) works unchanged; scores() widens one block of rows at a time instead of
+    the whole matrix.
+    """
+
+    def __init__(self, data, scale=None):
+        self.data = data
+        self.scale = scale
+        self.shape = data.shape
+
+    @classmethod
+    def quantize(cls, vecs, dtype):
+        vecs = np.asarray(vecs, dtype=np.float32)
+        if dtype == "float16":
+            return cls(vecs.astype(np.float16))
+        if dtype != "int8":
+            raise ValueError(f"Unknown EMBEDDING_DTYPE {dtype!r}, expected float32, float16 or int8")
+        scale = np.abs(vecs).max(axis=1) / 127 if vecs.size else np.zeros(len(vecs))
+        scale = np.where(scale > 0, scale, 1).astype(np.float32)
+        return cls(np.rint(vecs / scale[:, None]).astype(np.int8), scale)
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, rows):
+        block = self.data[rows].astype(np.float32)
+        if self.scale is not None:
+            block *= np.asarray(self.scale[rows], dtype=np.float32)[..., None]
+        return block
+
+    def __array__(self, dtype=None, copy=None):
+        vecs = self[:]
+        return vecs if dtype is None else vecs.astype(dtype)
+
+    def scores(self, queries, rows):
+        start, stop, _ = rows.indices(len(self))
+        out = np.empty((len(queries), max(stop - start, 0)), dtype=np.float32)
+        for block_start in range(start, stop, DEQUANTIZE_BLOCK_ROWS):
+            block_stop = min(block_start + DEQUANTIZE_BLOCK_ROWS, stop)
+            out[:, block_start - start:block_stop - start] = queries @ self[block_start:block_stop].T
+        return out
+
+
+def compact_vectors(vecs, dtype=EMBEDDING_DTYPE):
+    # The keyword matrix as the apps keep it in memory; float32 leaves it untouched
+    if dtype == "float32":
+        return vecs
+    return CompactVectors.quantize(vecs, dtype)
+
+
+def score_rows(queries, vecs, rows):
+    # Cosine similarities (n_queries, n_rows) of normalized queries against the row slice `rows`
+    if isinstance(vecs, CompactVectors):
+        return vecs.scores(queries, rows)
+    return queries @ vecs[rows].T
+
+
+def rerank(queries, cand_rows, sims, k, exact_vectors):
+    """Re-score each query's k best candidates with float32 vectors, in place.
+
+    `exact_vectors(rows)` returns (vectors, found) for dataset rows; rows it cannot
+    provide keep their compact score. Candidate rows of -1 (FAISS padding) are skipped.
+    """
+    tops = [top_k(sims[q], k) for q in range(len(sims))]
+    tops = [top[cand_rows[q][top] >= 0] for q, top in enumerate(tops)]
+    rows = np.unique(np.concatenate([cand_rows[q][top] for q, top in enumerate(tops)] or [np.empty(0, dtype=np.int64)]))
+    if not len(rows):
+        return sims
+    vecs, found = exact_vectors(rows)
+    for q, top in enumerate(tops):
+        positions = np.searchsorted(rows, cand_rows[q][top])
+        keep = found[positions]
+        sims[q, top[keep]] = vecs[positions[keep]] @ queries[q]
+    return sims
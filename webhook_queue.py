@@ -0,0 +1,146 @@
+import os
+import time
+import atexit
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "200"))          # flush as soon as this many records are pending
+WEBHOOK_FLUSH_SECONDS = float(os.getenv("WEBHOOK_FLUSH_SECONDS", "2.0"))  # ... or once the oldest has waited this long
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "3"))         # failed writes before a record is dropped
+
+log = logging.info
+
+
+class WebhookQueue:
+    """Collects webhook records off the request thread and writes them in batches.
+
+    Records are coalesced by Airtable id (the latest payload wins), flushed through
+    `flush_fn(records)` when WEBHOOK_BATCH_SIZE records are pending or the oldest has
+    waited WEBHOOK_FLUSH_SECONDS, and `on_flushed()` runs once after each batch.
+    """
+
+    def __init__(self, flush_fn, on_flushed=None, max_batch=WEBHOOK_BATCH_SIZE, max_wait=WEBHOOK_FLUSH_SECONDS):
+        self.flush_fn = flush_fn
+        self.on_flushed = on_flushed
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending = OrderedDict()
+        self._attempts = {}
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self.received = self.coalesced = self.flushed_records = self.flushed_batches = self.failures = self.dropped = 0
+        self.last_flush_seconds = 0.0
+        self.last_batch_lag_seconds = 0.0  # how long the oldest record of the last batch waited
+        self._start_worker()
+        atexit.register(self.flush)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_worker(self):
+        self._thread = threading.Thread(target=self._run, name="webhook-queue", daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        # Threads do not survive fork(); a pre-fork worker gets fresh locks and its own flush thread
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending.clear()  # the parent still owns whatever it had queued
+        self._oldest = None
+        self._start_worker()
+
+    def put(self, record):
+        with self._cond:
+            self.received += 1
+            if record["id"] in self._pending:
+                self.coalesced += 1
+            self._pending[record["id"]] = record
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._cond.notify()  # start the flush timer
+            elif len(self._pending) >= self.max_batch:
+                self._cond.notify()
+            return len(self._pending)
+
+    def _take(self):
+        if self._oldest is not None:
+            self.last_batch_lag_seconds = time.monotonic() - self._oldest
+        batch = list(self._pending.values())
+        self._pending.clear()
+        self._oldest = None
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._pending:
+                        age = time.monotonic() - self._oldest
+                        if len(self._pending) >= self.max_batch or age >= self.max_wait:
+                            break
+                        self._cond.wait(self.max_wait - age)
+                    else:
+                        self._cond.wait()
+                batch = self._take()
+            self._write(batch)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        with self._flush_lock:
+            started = time.monotonic()
+            try:
+                self.flush_fn(batch)
+            except Exception as e:
+                self.failures += 1
+                log(f"❌ Webhook batch of {len(batch)} failed, re-queueing: {e}")
+                log(traceback.format_exc())
+                with self._cond:
+                    for record in batch:
+                        attempts = self._attempts.get(record["id"], 0) + 1
+                        if attempts >= WEBHOOK_MAX_ATTEMPTS:
+                            self._attempts.pop(record["id"], None)
+                            self.dropped += 1
+                            log(f"🗑️ Dropping webhook record {record['id']} after {attempts} failed writes")
+                            continue
+                        self._attempts[record["id"]] = attempts
+                        self._pending.setdefault(record["id"], record)  # a newer payload may have arrived meanwhile
+                    if self._pending and self._oldest is None:
+                        self._oldest = time.monotonic()
+                return
+            with self._cond:
+                for record in batch:
+                    self._attempts.pop(record["id"], None)
+            self.last_flush_seconds = time.monotonic() - started
+            self.flushed_batches += 1
+            self.flushed_records += len(batch)
+            log(f"📦 Flushed {len(batch)} webhook records in {self.last_flush_seconds:.2f}s")
+
+            if self.on_flushed is not None:
+                try:
+                    self.on_flushed()
+                except Exception as e:
+                    log(f"❌ Post-flush hook failed: {e}")
+                    log(traceback.format_exc())
+
+    def flush(self):
+        """Write everything pending now, on the caller's thread."""
+        with self._cond:
+            batch = self._take()
+        self._write(batch)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "oldest_pending_seconds": time.monotonic() - self._oldest if self._oldest is not None else 0.0,
+                "received": self.received,
+                "coalesced": self.coalesced,
+                "flushed_records": self.flushed_records,
+                "flushed_batches": self.flushed_batches,
+                "failures": self.failures,
+                "dropped": self.dropped,
+                "last_flush_seconds": self.last_flush_seconds,
+                "last_batch_lag_seconds": self.last_batch_lag_seconds,
+            }